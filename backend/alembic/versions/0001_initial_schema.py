@@ -0,0 +1,77 @@
+"""initial schema: users, conversations, messages
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # checkfirst: базы, созданные раньше через Base.metadata.create_all, просто штампуются
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("user_id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("username", sa.String(50), nullable=False),
+            sa.Column("email", sa.String(255), nullable=False),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("weekly_goal_hours", sa.Integer(), nullable=True),
+            sa.Column("goal_last_updated", sa.Date(), nullable=True),
+        )
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "conversations" not in existing:
+        op.create_table(
+            "conversations",
+            sa.Column("conversation_id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column(
+                "user_id",
+                postgresql.UUID(as_uuid=True),
+                sa.ForeignKey("users.user_id", ondelete="CASCADE"),
+                nullable=False,
+            ),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("created_at", postgresql.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column("updated_at", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        )
+
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("message_id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column(
+                "conversation_id",
+                postgresql.UUID(as_uuid=True),
+                sa.ForeignKey("conversations.conversation_id", ondelete="CASCADE"),
+                nullable=False,
+            ),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", postgresql.TIMESTAMP(timezone=True), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("messages")
+    op.drop_table("conversations")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_index("ix_users_username", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,70 @@
+"""hot-path indexes for messages and conversations
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01
+
+Индексы строятся CONCURRENTLY, чтобы не блокировать запись в большие таблицы.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # История разговора: WHERE conversation_id = ? ORDER BY created_at
+        op.create_index(
+            "ix_messages_conversation_id_created_at",
+            "messages",
+            ["conversation_id", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Сайдбар: WHERE user_id = ? ORDER BY updated_at DESC
+        op.create_index(
+            "ix_conversations_user_id_updated_at",
+            "conversations",
+            ["user_id", sa.text("updated_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Прогресс: считаем только сообщения пользователя
+        op.create_index(
+            "ix_messages_user_role_conversation_id_created_at",
+            "messages",
+            ["conversation_id", "created_at"],
+            postgresql_where=sa.text("role = 'user'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_user_role_conversation_id_created_at",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_conversations_user_id_updated_at",
+            table_name="conversations",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_messages_conversation_id_created_at",
+            table_name="messages",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,42 @@
+"""user_daily_activity rollup and stored day streak
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:03
+
+После миграции заполнить данные: python -m app.progress.backfill
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_daily_activity",
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.user_id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("user_messages", sa.Integer(), nullable=False),
+    )
+    op.add_column("users", sa.Column("streak_days", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("users", sa.Column("streak_last_day", sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "streak_last_day")
+    op.drop_column("users", "streak_days")
+    op.drop_table("user_daily_activity")
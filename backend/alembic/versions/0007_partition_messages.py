@@ -0,0 +1,128 @@
+"""partition messages by created_at month
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:06
+
+messages пересоздаётся как секционированная по месяцам (RANGE по created_at) и
+заполняется из старой таблицы - миграция требует окна обслуживания на больших базах.
+Первичный ключ секционированной таблицы обязан содержать ключ секционирования:
+(message_id, created_at).
+
+Секции создаёт функция ensure_message_partitions(from_day, to_day) - её же вызывают
+обслуживание (app/chat/partitions.py) и импорт.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ENSURE_PARTITIONS_FUNCTION = """
+    CREATE OR REPLACE FUNCTION ensure_message_partitions(from_day date, to_day date) RETURNS integer
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        m date := date_trunc('month', from_day)::date;
+        partition_name text;
+        created integer := 0;
+    BEGIN
+        -- Несколько процессов не создают одну секцию одновременно
+        PERFORM pg_advisory_xact_lock(hashtext('ensure_message_partitions'));
+
+        WHILE m <= to_day LOOP
+            partition_name := 'messages_' || to_char(m, '"y"YYYY"m"MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    m::timestamp AT TIME ZONE 'UTC',
+                    (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                created := created + 1;
+            END IF;
+            m := (m + interval '1 month')::date;
+        END LOOP;
+
+        RETURN created;
+    END $$
+"""
+
+CREATE_INDEXES = [
+    "CREATE INDEX ix_messages_conversation_id_created_at ON messages (conversation_id, created_at)",
+    "CREATE INDEX ix_messages_user_role_conversation_id_created_at "
+    "ON messages (conversation_id, created_at) WHERE role = 'user'",
+    "CREATE INDEX ix_messages_content_tsv ON messages USING gin (content_tsv)",
+]
+
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS ix_messages_content_tsv",
+    "DROP INDEX IF EXISTS ix_messages_user_role_conversation_id_created_at",
+    "DROP INDEX IF EXISTS ix_messages_conversation_id_created_at",
+]
+
+COLUMNS = "message_id, conversation_id, role, content, created_at"
+
+
+def upgrade() -> None:
+    # Индексы старой таблицы занимают имена, которые нужны новой
+    for statement in DROP_INDEXES:
+        op.execute(statement)
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER INDEX messages_pkey RENAME TO messages_unpartitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE messages (
+            message_id uuid NOT NULL,
+            conversation_id uuid NOT NULL REFERENCES conversations (conversation_id) ON DELETE CASCADE,
+            role varchar(20) NOT NULL,
+            content text NOT NULL,
+            created_at timestamptz NOT NULL,
+            content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+            PRIMARY KEY (message_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+
+    # Секции от самого старого сообщения до трёх месяцев вперёд
+    op.execute("""
+        SELECT ensure_message_partitions(
+            coalesce((SELECT min(created_at) FROM messages_unpartitioned), now())::date,
+            (now() + interval '3 months')::date
+        )
+    """)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned")
+    op.execute("DROP TABLE messages_unpartitioned")
+
+    # Индексы на родительской таблице создаются и на всех секциях (и на будущих)
+    for statement in CREATE_INDEXES:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for statement in DROP_INDEXES:
+        op.execute(statement)
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER INDEX messages_pkey RENAME TO messages_partitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE messages (
+            message_id uuid PRIMARY KEY,
+            conversation_id uuid NOT NULL REFERENCES conversations (conversation_id) ON DELETE CASCADE,
+            role varchar(20) NOT NULL,
+            content text NOT NULL,
+            created_at timestamptz NOT NULL,
+            content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+        )
+    """)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned")
+    op.execute("DROP TABLE messages_partitioned CASCADE")
+    op.execute("DROP FUNCTION IF EXISTS ensure_message_partitions(date, date)")
+
+    for statement in CREATE_INDEXES:
+        op.execute(statement)
@@ -0,0 +1,32 @@
+"""messages.generating flag for in-progress AI answers
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:07
+
+true, пока ответ AI генерируется стримом (текст в БД - промежуточный); переподключение
+к стриму (GET .../messages/{message_id}/stream) отдаёт из БД только завершённые ответы.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Значение по умолчанию без перезаписи таблицы (PostgreSQL 11+), на все секции сразу
+    op.add_column(
+        "messages",
+        sa.Column("generating", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "generating")
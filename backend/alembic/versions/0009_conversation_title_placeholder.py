@@ -0,0 +1,40 @@
+"""conversations.title_placeholder flag
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:08
+
+true, пока у разговора название, заданное при создании: фоновая задача
+(app/chat/tasks.py) заменяет только такое название и не трогает переименованные
+и импортированные разговоры.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("title_placeholder", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    # Разговоры без сообщений ещё ждут автоназвания по первому сообщению
+    op.execute("""
+        UPDATE conversations c SET title_placeholder = true
+        WHERE NOT EXISTS (
+            SELECT 1 FROM messages m
+            WHERE m.conversation_id = c.conversation_id AND m.created_at >= c.created_at
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "title_placeholder")
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, status
+
+from app.auth.dependencies import get_admin_user
+from app.core.config import settings
+from app.core.slow_query import slow_query_log
+
+router = APIRouter(dependencies=[Depends(get_admin_user)])
+
+@router.get("/slow-queries")
+async def get_slow_queries():
+    """Последние медленные запросы и планы самых медленных (SLOW_QUERY_LOG=true)"""
+    return {"enabled": settings.SLOW_QUERY_LOG, **slow_query_log.snapshot()}
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    slow_query_log.clear()
@@ -1,14 +1,69 @@
+import hashlib
+import time
+from uuid import UUID
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, inspect
+from sqlalchemy.orm import make_transient_to_detached
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.security import decode_access_token
 from app.core.database import get_db
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
+# sha256(token) -> (user_id, exp): повторные запросы не проверяют подпись заново
+_token_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+# user_id -> значения колонок User: повторные запросы не ходят в БД
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user_cache(user_id: UUID) -> None:
+    """Вызывать после любого изменения пользователя"""
+    _user_cache.pop(user_id)
+
+
+def _snapshot(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def _from_snapshot(snapshot: dict, db: AsyncSession) -> User:
+    # Восстанавливаем пользователя как уже сохранённый и прикрепляем к сессии запроса
+    # без SELECT - изменения в эндпоинтах сохраняются обычным db.commit()
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+def _resolve_token(token: str) -> str | None:
+    digest = hashlib.sha256(token.encode()).digest()
+
+    cached = _token_cache.get(digest)
+    if cached is not None:
+        subject, expires_at = cached
+        if expires_at > time.time():
+            return subject
+        _token_cache.pop(digest)
+        return None
+
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+
+    subject = payload.get("sub")
+    if subject is None:
+        return None
+
+    expires_at = payload.get("exp", 0)
+    _token_cache.set(digest, (subject, expires_at), ttl=min(settings.AUTH_CACHE_TTL_SECONDS, expires_at - time.time()))
+    return subject
+
+
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
         db: AsyncSession = Depends(get_db)
@@ -19,21 +74,32 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    payload = decode_access_token(token)
-    if payload is None:
+    subject = _resolve_token(token)
+    if subject is None:
         raise credentials_exception
 
-    email: str = payload.get("sub")
-    if email is None:
-        raise credentials_exception
+    try:
+        user_id = UUID(subject)
+    except ValueError:
+        # Старые токены содержат email в sub
+        result = await db.execute(select(User).filter(User.email == subject))
+        user = result.scalars().first()
+    else:
+        snapshot = _user_cache.get(user_id)
+        if snapshot is not None:
+            return _from_snapshot(snapshot, db)
 
-    result = await db.execute(select(User).filter(User.email == email))
-    user = result.scalars().first()
+        user = await db.get(User, user_id)
 
     if user is None:
         raise credentials_exception
 
-    return user
+    snapshot = _snapshot(user)
+    _user_cache.set(user.user_id, snapshot)
+    # Загрузка заняла соединение сессии запроса до его конца. Отдаём его пулу: загрузчики
+    # singleflight открывают свои сессии, а эндпоинт возьмёт соединение, только если пойдёт в БД
+    await db.close()
+    return _from_snapshot(snapshot, db)
 
 async def get_current_active_user(
         current_user: User = Depends(get_current_user)
@@ -43,3 +109,13 @@ async def get_current_active_user(
         raise HTTPException(status_code= 400, detail="Inactive user")
 
     return current_user
+
+async def get_admin_user(
+        current_user: User = Depends(get_current_user)
+) -> User:
+    admins = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+
+    if current_user.email.lower() not in admins:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+    return current_user
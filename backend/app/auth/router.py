@@ -1,13 +1,14 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import timedelta
 
 from app.auth.schemas import UserRegister, UserResponse, Token, UserUpdate, PasswordChange, GoalUpdate
-from app.auth.dependencies import get_current_active_user
-from app.core.security import hash_password, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.auth.dependencies import get_current_active_user, invalidate_user_cache
+from app.core.security import hash_password_async, verify_password_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.core.database import get_db
+from app.core.etag import make_etag, conditional_response
 from app.models.user import User
 
 router = APIRouter()
@@ -28,7 +29,7 @@ async def register(user: UserRegister, db: AsyncSession = Depends(get_db)):
     new_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hash_password_async(user.password),
     )
 
     db.add(new_user)
@@ -52,15 +53,29 @@ async def login(
     result = await db.execute(select(User).filter(User.email == form_data.username))
     user = result.scalars().first()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    password_ok, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not password_ok:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Параметры Argon2 поменялись - прозрачно перехэшируем пароль
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        invalidate_user_cache(user.user_id)
+
     access_token = create_access_token(
-        data={"sub": user.email},
+        data={"sub": str(user.user_id)},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -69,9 +84,21 @@ async def login(
 
 @router.get("/me")
 async def get_me(
+        request: Request,
+        response: Response,
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_db)
 ):
+    not_modified = conditional_response(
+        request, response,
+        make_etag(
+            current_user.user_id, current_user.username, current_user.email,
+            current_user.weekly_goal_hours, current_user.goal_last_updated
+        )
+    )
+    if not_modified:
+        return not_modified
+
     return {
         "user_id": current_user.user_id,
         "username": current_user.username,
@@ -115,6 +142,7 @@ async def update_user_profile(
 
     await db.commit()
     await db.refresh(current_user)
+    invalidate_user_cache(current_user.user_id)
 
     return {
         "message": "Profile updated successfully",
@@ -130,12 +158,14 @@ async def change_password(
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_db)
 ):
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    password_ok, _ = await verify_password_async(password_data.current_password, current_user.hashed_password)
+    if not password_ok:
         raise HTTPException(status_code=400, detail="Incorrect current password")
 
-    current_user.hashed_password = hash_password(password_data.new_password)
+    current_user.hashed_password = await hash_password_async(password_data.new_password)
 
     await db.commit()
+    invalidate_user_cache(current_user.user_id)
 
     return {"message": "Password changed successfully"}
 
@@ -164,6 +194,7 @@ async def update_weekly_goal(
 
     await db.commit()
     await db.refresh(current_user)
+    invalidate_user_cache(current_user.user_id)
 
     return {
         "message": "Goal updated successfully",
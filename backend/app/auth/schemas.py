@@ -23,7 +23,7 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 class TokenData(BaseModel):
-    email: str | None = None
+    user_id: uuid.UUID | None = None
 
 class UserUpdate(BaseModel):
     username: str | None = None
@@ -0,0 +1,164 @@
+import io
+import json
+import zipfile
+import zlib
+from typing import AsyncIterator
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.conversation import Conversation, Message
+
+# Строк на одну выборку серверного курсора - память экспорта не зависит от размера истории
+EXPORT_BATCH_SIZE = 500
+
+
+async def _export_rows(user_id: UUID) -> AsyncIterator[list]:
+    """
+    Разговоры пользователя с сообщениями пачками по EXPORT_BATCH_SIZE строк
+
+    Одна строка - (разговор, сообщение), сообщения разговора идут подряд по времени.
+    Читаем кортежи колонок, а не ORM-объекты: identity map сессии не растёт.
+    """
+    query = (
+        select(
+            Conversation.conversation_id,
+            Conversation.title,
+            Conversation.created_at,
+            Conversation.updated_at,
+            Message.message_id,
+            Message.role,
+            Message.content,
+            Message.created_at.label("message_created_at"),
+        )
+        .outerjoin(Message, Message.conversation_id == Conversation.conversation_id)
+        .where(Conversation.user_id == user_id)
+        .order_by(
+            Conversation.created_at,
+            Conversation.conversation_id,
+            Message.created_at,
+            Message.message_id,
+        )
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    # Своя сессия: стрим идёт после выхода из эндпоинта, соединение держится до конца выгрузки
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for batch in result.partitions():
+            yield batch
+
+
+def _conversation_record(row) -> dict:
+    return {
+        "conversation_id": str(row.conversation_id),
+        "title": row.title,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
+def _message_record(row) -> dict:
+    return {
+        "message_id": str(row.message_id),
+        "conversation_id": str(row.conversation_id),
+        "role": row.role,
+        "content": row.content,
+        "created_at": row.message_created_at.isoformat(),
+    }
+
+
+async def export_ndjson(user_id: UUID, gzip: bool = False) -> AsyncIterator[bytes]:
+    """
+    NDJSON: строка {"type": "conversation", ...}, за ней строки {"type": "message", ...} её сообщений
+
+    gzip=True - сжатие на лету (Content-Encoding: gzip)
+    """
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    current = None
+
+    async for batch in _export_rows(user_id):
+        lines = []
+        for row in batch:
+            if row.conversation_id != current:
+                current = row.conversation_id
+                lines.append(json.dumps({"type": "conversation", **_conversation_record(row)}, ensure_ascii=False))
+            if row.message_id is not None:
+                lines.append(json.dumps({"type": "message", **_message_record(row)}, ensure_ascii=False))
+
+        data = ("\n".join(lines) + "\n").encode()
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    if compressor:
+        yield compressor.flush()
+
+
+class _ZipStream(io.RawIOBase):
+    """Несжимаемый поток для ZipFile: всё записанное забирается drain() и отдаётся клиенту"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def export_zip(user_id: UUID) -> AsyncIterator[bytes]:
+    """
+    Zip-архив: conversations/<conversation_id>.json на каждый разговор
+
+    Архив пишется в неперематываемый поток (размеры - в data descriptor после файла),
+    JSON разговора - по мере чтения сообщений, целиком в памяти не собирается.
+    """
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED)
+    entry = None
+    current = None
+    first_message = True
+
+    def close_entry():
+        entry.write(b"]}\n")
+        entry.close()
+
+    async for batch in _export_rows(user_id):
+        for row in batch:
+            if row.conversation_id != current:
+                if entry is not None:
+                    close_entry()
+                current = row.conversation_id
+                entry = archive.open(f"conversations/{current}.json", mode="w", force_zip64=True)
+                header = json.dumps(_conversation_record(row), ensure_ascii=False)
+                entry.write(f'{{"conversation": {header}, "messages": ['.encode())
+                first_message = True
+
+            if row.message_id is not None:
+                record = json.dumps(_message_record(row), ensure_ascii=False)
+                entry.write((record if first_message else "," + record).encode())
+                first_message = False
+
+        data = stream.drain()
+        if data:
+            yield data
+
+    if entry is not None:
+        close_entry()
+    archive.close()
+    yield stream.drain()
@@ -0,0 +1,244 @@
+"""
+Генерации ответов AI, не привязанные к соединению клиента.
+
+Генерация идёт отдельной задачей и копит текст в памяти процесса (ответ ограничен
+MAX_TOKENS, число генераций - GENERATION_MAX_BUFFERED). Подписчики - стрим, который
+её запустил, и GET .../messages/{message_id}/stream - читают текст с любой позиции:
+буфер целиком, потом новые куски. Обрыв соединения генерацию не останавливает;
+удаление сообщения или разговора - останавливает и ничего не сохраняет.
+
+Завершённая генерация сохранена в БД и из реестра удаляется - дальше её отдаёт БД.
+Пока ответ не окончательный, у сообщения стоит generating (промежуточные сохранения
+его не снимают). Реестр - в памяти процесса: при нескольких воркерах подключение к
+идущей генерации работает в том воркере, который её запустил, остальные отвечают 409.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List
+from uuid import UUID
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.conversation import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationFailed(Exception):
+    """Генерация завершилась ошибкой; текст - для кадра error"""
+
+
+async def save_assistant_content(
+        conversation_id: UUID,
+        message_id: UUID,
+        created_at: datetime,
+        content: str,
+        final: bool = True
+) -> None:
+    """
+    Сохраняет текст ответа AI в отдельной короткой сессии (соединение берётся только на запись)
+
+    final=False - промежуточное сохранение, сообщение остаётся generating.
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Message)
+            .where(Message.message_id == message_id, Message.created_at == created_at)
+            .values(content=content, generating=not final)
+        )
+        await session.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id == conversation_id)
+            .values(updated_at=datetime.now(timezone.utc))
+        )
+        await session.commit()
+
+
+class Generation:
+    """Ответ AI, который генерируется сейчас"""
+
+    def __init__(self, message_id: UUID, conversation_id: UUID, created_at: datetime, user_id: UUID):
+        self.message_id = message_id
+        self.conversation_id = conversation_id
+        self.created_at = created_at
+        self.user_id = user_id
+        self.parts: List[str] = []
+        self.length = 0
+        self.done = False
+        self.error: str | None = None
+        self.discarded = False
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    def _notify(self) -> None:
+        # Ждущие держат ссылку на старое событие - его set() будит их всех
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, text: str) -> None:
+        self.parts.append(text)
+        self.length += len(text)
+        self._notify()
+
+    def finish(self, error: str | None = None) -> None:
+        if not self.done:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    async def save(self, final: bool = True) -> None:
+        await save_assistant_content(self.conversation_id, self.message_id, self.created_at, self.content, final)
+
+    async def follow(self, position: int = 0) -> AsyncIterator[str]:
+        """Текст начиная с позиции position (в символах): накопленный, затем новый до конца генерации"""
+        index = 0
+        end = 0
+        while True:
+            while index < len(self.parts):
+                part = self.parts[index]
+                start, end = end, end + len(part)
+                index += 1
+                if end > position:
+                    yield part[max(0, position - start):]
+
+            if self.done:
+                if self.error is not None:
+                    raise GenerationFailed(self.error)
+                return
+            await self._changed.wait()
+
+
+async def run_generation(generation: Generation, deltas: AsyncGenerator[str, None]) -> None:
+    """Копит куски ответа в generation и сохраняет его в БД (с промежуточными сохранениями)"""
+    checkpoint_interval = settings.STREAM_CHECKPOINT_SECONDS
+    last_checkpoint = time.monotonic()
+    finalized = False
+    error = None
+
+    try:
+        async for delta in deltas:
+            generation.append(delta)
+
+            if checkpoint_interval and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                await generation.save(final=False)
+                last_checkpoint = time.monotonic()
+
+        await generation.save()
+        finalized = True
+
+    except asyncio.CancelledError:
+        error = "Generation was stopped"
+        raise
+
+    except Exception as e:
+        error = str(e)
+
+    finally:
+        await deltas.aclose()
+        # Ошибка или остановка - сохраняем то, что успели сгенерировать, как окончательный
+        # ответ (если сообщение не удалено)
+        if not finalized and not generation.discarded:
+            try:
+                await asyncio.shield(generation.save())
+            except Exception as e:
+                logger.warning("Failed to save partial response %s: %s", generation.message_id, e)
+        # Подписчики получают [DONE] или ошибку, когда ответ уже в БД
+        generation.finish(error)
+
+
+class GenerationLimitReached(Exception):
+    """В процессе уже идёт max_generations генераций"""
+
+
+class GenerationRegistry:
+    """
+    Идущие генерации процесса по message_id
+
+    Место под генерацию резервируется (reserve) до записи сообщений в БД и
+    занимается в start; без резерва start сам проверяет лимит.
+    """
+
+    def __init__(self, max_generations: int):
+        self.max_generations = max_generations
+        self._generations: Dict[UUID, Generation] = {}
+        self._reserved = 0
+
+    def __len__(self) -> int:
+        return len(self._generations)
+
+    def is_full(self) -> bool:
+        return len(self._generations) + self._reserved >= self.max_generations
+
+    def reserve(self) -> None:
+        if self.is_full():
+            raise GenerationLimitReached()
+        self._reserved += 1
+
+    def cancel_reservation(self) -> None:
+        self._reserved -= 1
+
+    def get(self, message_id: UUID) -> Generation | None:
+        return self._generations.get(message_id)
+
+    def start(
+            self,
+            generation: Generation,
+            deltas: AsyncGenerator[str, None],
+            on_done: Callable[[], None] | None = None,
+            reserved: bool = False
+    ) -> None:
+        """
+        Запускает генерацию отдельной задачей
+
+        reserved - место занято заранее через reserve(). on_done вызывается по завершении
+        задачи в любом случае (даже если её отменили до первого шага) - например,
+        освобождение слота LLM.
+        """
+        if reserved:
+            self._reserved -= 1
+        elif self.is_full():
+            raise GenerationLimitReached()
+
+        generation.task = asyncio.create_task(
+            run_generation(generation, deltas), name=f"generation-{generation.message_id}"
+        )
+        self._generations[generation.message_id] = generation
+
+        def done(_task: asyncio.Task) -> None:
+            self._generations.pop(generation.message_id, None)
+            # Отменённая до старта задача не выполнила run_generation - подписчики не должны ждать вечно
+            generation.finish(error="Generation was stopped")
+            if on_done is not None:
+                on_done()
+
+        generation.task.add_done_callback(done)
+
+    def discard(self, message_id: UUID) -> None:
+        """Останавливает генерацию без сохранения (сообщение удаляется)"""
+        generation = self._generations.get(message_id)
+        if generation is not None:
+            generation.discarded = True
+            generation.task.cancel()
+
+    def discard_conversation(self, conversation_id: UUID) -> None:
+        for generation in list(self._generations.values()):
+            if generation.conversation_id == conversation_id:
+                self.discard(generation.message_id)
+
+    async def shutdown(self) -> None:
+        """Останавливает все генерации, сохранив накопленный текст"""
+        tasks = [generation.task for generation in self._generations.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+generations = GenerationRegistry(max_generations=settings.GENERATION_MAX_BUFFERED)
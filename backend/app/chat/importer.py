@@ -0,0 +1,422 @@
+"""
+Массовый импорт разговоров из NDJSON (перенос со старой платформы).
+
+Одна строка - один разговор:
+    {"external_id": "42", "user": "student@example.com", "title": "...", "created_at": "...",
+     "messages": [{"role": "user", "content": "...", "created_at": "..."}, ...]}
+
+Строки проверяются по одной и копятся пачками; пачка загружается через COPY во
+временные таблицы и переносится INSERT ... ON CONFLICT DO NOTHING. Идентификаторы
+детерминированы (uuid5 от источника и external_id), поэтому повторный запуск
+догружает только новое.
+
+Сообщения из будущего отклоняются. Недостающие секции messages создаёт только запуск
+из командной строки (не больше MAX_NEW_PARTITIONS_PER_BATCH на пачку); импорт через
+API принимает сообщения не раньше создания аккаунта и только в существующие секции.
+
+Запуск:
+    python -m app.chat.importer dump.ndjson [--user-map users.csv] [--source legacy]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Literal, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from sqlalchemy import select
+
+from app.core.database import engine, AsyncSessionLocal
+from app.models.user import User
+from app.progress.backfill import rebuild_streaks
+from app.chat.partitions import ensure_partitions, month_start, partition_months
+
+IMPORT_NAMESPACE = uuid.UUID("6f1c1a52-5d1e-4c36-9a57-2f0d8e4b7c11")
+DEFAULT_BATCH_SIZE = 5000
+MAX_LINE_BYTES = 16 * 1024 * 1024
+# Загрузка через API целиком (CLI читает файл без ограничения)
+MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+MAX_REPORTED_ERRORS = 100
+MAX_NEW_PARTITIONS_PER_BATCH = 36
+# Допустимое расхождение часов источника: сообщения позже now + MAX_CLOCK_SKEW отклоняются
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+CONVERSATION_COLUMNS = ["conversation_id", "user_id", "title", "created_at", "updated_at"]
+MESSAGE_COLUMNS = ["message_id", "conversation_id", "role", "content", "created_at"]
+
+INSERT_CONVERSATIONS_SQL = """
+    INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at)
+    SELECT conversation_id, user_id, title, created_at, updated_at FROM import_conversations
+    ON CONFLICT (conversation_id) DO NOTHING
+"""
+
+# Сообщения - только в разговоры того же владельца, что в пачке (защита от совпавших id);
+# новые сообщения пользователя сразу попадают в дневную сводку прогресса
+INSERT_MESSAGES_SQL = """
+    WITH inserted AS (
+        INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+        SELECT m.message_id, m.conversation_id, m.role, m.content, m.created_at
+        FROM import_messages m
+        JOIN import_conversations ic ON ic.conversation_id = m.conversation_id
+        JOIN conversations c ON c.conversation_id = m.conversation_id AND c.user_id = ic.user_id
+        ON CONFLICT (message_id, created_at) DO NOTHING
+        RETURNING conversation_id, role, created_at
+    ),
+    activity AS (
+        INSERT INTO user_daily_activity (user_id, day, user_messages)
+        SELECT c.user_id, (i.created_at AT TIME ZONE 'UTC')::date AS day, count(*)
+        FROM inserted i JOIN conversations c ON c.conversation_id = i.conversation_id
+        WHERE i.role = 'user'
+        GROUP BY c.user_id, day
+        ON CONFLICT (user_id, day) DO UPDATE
+            SET user_messages = user_daily_activity.user_messages + EXCLUDED.user_messages
+    )
+    SELECT count(*) FROM inserted
+"""
+
+
+class ImportTooLarge(Exception):
+    """Загрузка больше допустимого размера"""
+
+
+class ImportLineTooLarge(ImportTooLarge):
+    """Строка NDJSON длиннее MAX_LINE_BYTES"""
+
+
+class PartitionLimitExceeded(Exception):
+    """Пачке нужно больше MAX_NEW_PARTITIONS_PER_BATCH новых секций messages"""
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class ImportMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str = Field(min_length=1)
+    created_at: datetime
+
+    @field_validator("content")
+    @classmethod
+    def no_nul(cls, value: str) -> str:
+        # PostgreSQL не хранит \x00 в text - иначе падает вся пачка
+        if "\x00" in value:
+            raise ValueError("content must not contain NUL characters")
+        return value
+
+    @field_validator("created_at")
+    @classmethod
+    def assume_utc(cls, value: datetime) -> datetime:
+        return _utc(value)
+
+
+class ImportConversation(BaseModel):
+    external_id: str = Field(min_length=1, max_length=255)
+    user: Optional[str] = None  # email или id на старой платформе (см. --user-map)
+    title: str = Field("Imported conversation", max_length=255)
+    created_at: Optional[datetime] = None
+    messages: List[ImportMessage] = []
+
+    @field_validator("created_at")
+    @classmethod
+    def assume_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return _utc(value) if value else value
+
+
+@dataclass
+class ImportReport:
+    lines: int = 0
+    conversations_inserted: int = 0
+    messages_inserted: int = 0
+    skipped: int = 0
+    unknown_users: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def messages_per_second(self) -> float:
+        return round(self.messages_inserted / self.seconds, 1) if self.seconds else 0.0
+
+    def error(self, line: int, message: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+    def as_dict(self) -> dict:
+        return {
+            "lines": self.lines,
+            "conversations_inserted": self.conversations_inserted,
+            "messages_inserted": self.messages_inserted,
+            "skipped": self.skipped,
+            "unknown_users": self.unknown_users,
+            "seconds": round(self.seconds, 2),
+            "messages_per_second": self.messages_per_second,
+            "errors": self.errors,
+        }
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], max_bytes: int | None = None) -> AsyncIterator[bytes]:
+    """
+    Режет поток байтов на строки, не держа в памяти больше одной строки
+
+    Режется только новый кусок, незаконченная строка копится частями - без повторного
+    разбора буфера. max_bytes - предел всего потока.
+    """
+    tail: List[bytes] = []
+    tail_size = 0
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise ImportTooLarge(f"upload exceeds {max_bytes} bytes")
+
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            first = lines[0]
+            if tail_size + len(first) > MAX_LINE_BYTES:
+                raise ImportLineTooLarge(f"NDJSON line exceeds {MAX_LINE_BYTES} bytes")
+            yield b"".join([*tail, first]) if tail else first
+            for line in lines[1:]:
+                if len(line) > MAX_LINE_BYTES:
+                    raise ImportLineTooLarge(f"NDJSON line exceeds {MAX_LINE_BYTES} bytes")
+                yield line
+            tail.clear()
+            tail_size = 0
+
+        if rest:
+            tail.append(rest)
+            tail_size += len(rest)
+            if tail_size > MAX_LINE_BYTES:
+                raise ImportLineTooLarge(f"NDJSON line exceeds {MAX_LINE_BYTES} bytes")
+
+    if tail:
+        yield b"".join(tail)
+
+
+class ConversationImporter:
+    """
+    Загрузка разговоров пачками через COPY
+
+    user_id - импорт в один аккаунт (эндпоинт); иначе владелец определяется по полю user
+    через user_map (старый id -> email) и email пользователя.
+
+    earliest - самое раннее допустимое время разговоров и сообщений. create_partitions=False -
+    секции не создаются, разговоры с сообщениями вне существующих секций пропускаются.
+    """
+
+    def __init__(
+            self,
+            source: str = "legacy",
+            user_id: UUID | None = None,
+            user_map: Dict[str, str] | None = None,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            earliest: datetime | None = None,
+            create_partitions: bool = True,
+    ):
+        self.source = source
+        self.user_id = user_id
+        self.user_map = user_map or {}
+        self.batch_size = batch_size
+        self.earliest = _utc(earliest) if earliest else None
+        self.create_partitions = create_partitions
+        self._partition_months: set[date] = set()
+        self.report = ImportReport()
+        self._user_ids: Dict[str, UUID | None] = {}
+        self._affected_users: set[UUID] = set()
+        self._pending: List[tuple[int, ImportConversation]] = []
+        self._pending_messages = 0
+
+    def _id(self, kind: str, *parts) -> UUID:
+        return uuid.uuid5(IMPORT_NAMESPACE, ":".join([self.source, kind, *map(str, parts)]))
+
+    async def run(self, lines: AsyncIterator[bytes]) -> ImportReport:
+        started = time.perf_counter()
+
+        async with engine.connect() as conn:
+            self._partition_months = await partition_months(conn)
+
+        async for raw in lines:
+            self.report.lines += 1
+            if not raw.strip():
+                continue
+            try:
+                conversation = ImportConversation.model_validate_json(raw)
+            except ValidationError as e:
+                first = e.errors()[0]
+                location = ".".join(map(str, first["loc"]))
+                self.report.error(self.report.lines, f"{location}: {first['msg']}" if location else first["msg"])
+                continue
+
+            self._pending.append((self.report.lines, conversation))
+            self._pending_messages += len(conversation.messages)
+            if self._pending_messages >= self.batch_size or len(self._pending) >= self.batch_size:
+                await self._flush()
+
+        await self._flush()
+
+        if self._affected_users:
+            async with engine.begin() as conn:
+                await rebuild_streaks(conn, list(self._affected_users))
+
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+    async def _resolve_users(self) -> None:
+        """Владельцы пачки одним запросом; найденные и ненайденные запоминаются"""
+        emails = set()
+        for _, conversation in self._pending:
+            if conversation.user is not None and conversation.user not in self._user_ids:
+                emails.add(self.user_map.get(conversation.user, conversation.user).lower())
+        if not emails:
+            return
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(User.email, User.user_id).where(User.email.in_(emails)))
+            found = {email.lower(): user_id for email, user_id in result.all()}
+
+        for _, conversation in self._pending:
+            if conversation.user is not None and conversation.user not in self._user_ids:
+                email = self.user_map.get(conversation.user, conversation.user).lower()
+                self._user_ids[conversation.user] = found.get(email)
+
+    def _timestamp_error(self, conversation: ImportConversation) -> str | None:
+        latest = datetime.now(timezone.utc) + MAX_CLOCK_SKEW
+        timestamps = [message.created_at for message in conversation.messages]
+        if conversation.created_at is not None:
+            timestamps.append(conversation.created_at)
+
+        for value in timestamps:
+            if value > latest:
+                return f"created_at {value.isoformat()} is in the future"
+            if self.earliest is not None and value < self.earliest:
+                return f"created_at {value.isoformat()} is earlier than {self.earliest.isoformat()}"
+
+        if not self.create_partitions:
+            for message in conversation.messages:
+                if month_start(message.created_at.astimezone(timezone.utc).date()) not in self._partition_months:
+                    return f"created_at {message.created_at.isoformat()} is outside the stored message range"
+        return None
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+
+        if self.user_id is None:
+            await self._resolve_users()
+
+        conversations = []
+        messages = []
+        for line, conversation in self._pending:
+            user_id = self.user_id or self._user_ids.get(conversation.user)
+            if user_id is None:
+                self.report.unknown_users += 1
+                self.report.error(line, f"unknown user {conversation.user!r}")
+                continue
+
+            timestamp_error = self._timestamp_error(conversation)
+            if timestamp_error is not None:
+                self.report.error(line, timestamp_error)
+                continue
+
+            conversation_id = self._id("conversation", conversation.external_id)
+            timestamps = [message.created_at for message in conversation.messages]
+            # Разговор не позже первого сообщения: история читается с отсечением секций по created_at разговора
+            created_at = min([*timestamps, conversation.created_at or datetime.now(timezone.utc)])
+            updated_at = max(timestamps, default=created_at)
+            conversations.append((conversation_id, user_id, conversation.title, created_at, updated_at))
+
+            for index, message in enumerate(conversation.messages):
+                messages.append((
+                    self._id("message", conversation.external_id, index),
+                    conversation_id,
+                    message.role,
+                    message.content,
+                    message.created_at,
+                ))
+            self._affected_users.add(user_id)
+
+        self._pending.clear()
+        self._pending_messages = 0
+        if not conversations:
+            return
+
+        missing_months = []
+        if messages and self.create_partitions:
+            months = {month_start(message[4].astimezone(timezone.utc).date()) for message in messages}
+            missing_months = sorted(months - self._partition_months)
+            if len(missing_months) > MAX_NEW_PARTITIONS_PER_BATCH:
+                raise PartitionLimitExceeded(
+                    f"batch needs {len(missing_months)} new messages partitions "
+                    f"(limit {MAX_NEW_PARTITIONS_PER_BATCH}), use a smaller --batch-size"
+                )
+
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TEMP TABLE import_conversations "
+                "(LIKE conversations INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            await conn.exec_driver_sql(
+                "CREATE TEMP TABLE import_messages "
+                "(LIKE messages INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+
+            # Только месяцы, где есть сообщения: без пустых секций между далёкими датами
+            for month in missing_months:
+                await ensure_partitions(conn, month, month)
+
+            # COPY напрямую через asyncpg - в той же транзакции, что и перенос в основные таблицы
+            raw_connection = await conn.get_raw_connection()
+            driver = raw_connection.driver_connection
+            await driver.copy_records_to_table(
+                "import_conversations", records=conversations, columns=CONVERSATION_COLUMNS
+            )
+            if messages:
+                await driver.copy_records_to_table(
+                    "import_messages", records=messages, columns=MESSAGE_COLUMNS
+                )
+
+            inserted = await conn.exec_driver_sql(INSERT_CONVERSATIONS_SQL)
+            self.report.conversations_inserted += inserted.rowcount
+            inserted_messages = await conn.exec_driver_sql(INSERT_MESSAGES_SQL)
+            self.report.messages_inserted += inserted_messages.scalar_one()
+
+        self._partition_months.update(missing_months)
+
+
+def _load_user_map(path: str) -> Dict[str, str]:
+    """CSV без заголовка: старый_id,email"""
+    with open(path, newline="") as f:
+        return {row[0]: row[1] for row in csv.reader(f) if len(row) >= 2}
+
+
+async def _file_lines(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        for line in f:
+            yield line
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Import conversations from NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--user-map", help="CSV: legacy user id,email")
+    parser.add_argument("--source", default="legacy", help="namespace for deterministic ids")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    importer = ConversationImporter(
+        source=args.source,
+        user_map=_load_user_map(args.user_map) if args.user_map else None,
+        batch_size=args.batch_size,
+    )
+    report = await importer.run(_file_lines(args.path))
+    print(json.dumps(report.as_dict(), indent=2))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+"""
+Обслуживание секций messages (по месяцам created_at).
+
+- заранее создаёт секции на MESSAGES_PARTITIONS_AHEAD месяцев вперёд;
+- секции старше MESSAGES_RETENTION_MONTHS отсоединяет, выгружает в
+  MESSAGES_ARCHIVE_DIR/<секция>.csv.gz и удаляет из БД.
+
+Работает в фоне приложения раз в PARTITION_MAINTENANCE_HOURS; вручную или из cron
+(идемпотентно, параллельные запуски пропускаются):
+    python -m app.chat.partitions
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+ARCHIVE_COLUMNS = ["message_id", "conversation_id", "role", "content", "created_at"]
+MAINTENANCE_LOCK = "messages_partition_maintenance"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def ensure_partitions(conn: AsyncConnection, start: date, end: date) -> int:
+    """Создаёт недостающие секции для месяцев от start до end включительно (в транзакции conn)"""
+    result = await conn.execute(
+        text("SELECT ensure_message_partitions(:start, :end)"),
+        {"start": start, "end": end},
+    )
+    return result.scalar_one()
+
+
+async def partition_months(conn: AsyncConnection) -> Set[date]:
+    """Месяцы, для которых к messages присоединена секция"""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass"
+    ))
+
+    months = set()
+    for name in result.scalars():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.add(date(int(match.group(1)), int(match.group(2)), 1))
+    return months
+
+
+async def _expired_partitions(conn: AsyncConnection, horizon: date) -> List[str]:
+    """Секции (в том числе уже отсоединённые прошлым прерванным запуском), целиком старше horizon"""
+    result = await conn.execute(text(
+        "SELECT relname FROM pg_class "
+        "WHERE relnamespace = current_schema()::regnamespace AND relkind = 'r' "
+        "AND relname ~ '^messages_y[0-9]{4}m[0-9]{2}$'"
+    ))
+
+    expired = []
+    for name in result.scalars():
+        match = PARTITION_NAME.match(name)
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if add_months(month, 1) <= horizon:
+            expired.append(name)
+    return sorted(expired)
+
+
+async def archive_partition(name: str, archive_dir: Path) -> int:
+    """Отсоединяет секцию, выгружает её в gzip-CSV и удаляет; возвращает число строк"""
+    async with engine.begin() as conn:
+        attached = await conn.execute(
+            text("SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:name AS regclass)"),
+            {"name": name},
+        )
+        if attached.first():
+            # DETACH берёт эксклюзивную блокировку messages - не ждём её долго, повторим в следующий раз
+            await conn.exec_driver_sql("SET LOCAL lock_timeout = '5s'")
+            await conn.exec_driver_sql(f'ALTER TABLE messages DETACH PARTITION "{name}"')
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.csv.gz"
+    partial = archive_dir / f"{name}.csv.gz.partial"
+
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        with gzip.open(partial, "wb") as archive:
+            async def write(chunk: bytes) -> None:
+                # Сжатие - в потоке, event loop приложения не блокируется
+                await asyncio.to_thread(archive.write, chunk)
+
+            await raw_connection.driver_connection.copy_from_table(
+                name, columns=ARCHIVE_COLUMNS, output=write, format="csv", header=True
+            )
+        rows = (await conn.exec_driver_sql(f'SELECT count(*) FROM "{name}"')).scalar_one()
+
+    # Удаляем из БД только полностью записанный архив
+    os.replace(partial, path)
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(f'DROP TABLE "{name}"')
+
+    return rows
+
+
+async def maintain_partitions() -> Dict:
+    today = datetime.now(timezone.utc).date()
+    report: Dict = {"created": 0, "archived": {}}
+
+    async with engine.connect() as conn:
+        # Сессионная блокировка: один обслуживающий процесс на всю базу
+        locked = await conn.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": MAINTENANCE_LOCK}
+        )
+        if not locked.scalar_one():
+            await conn.rollback()
+            return {**report, "skipped": True}
+
+        try:
+            report["created"] = await ensure_partitions(
+                conn, today, add_months(month_start(today), settings.MESSAGES_PARTITIONS_AHEAD)
+            )
+            await conn.commit()
+
+            if settings.MESSAGES_RETENTION_MONTHS > 0:
+                horizon = add_months(month_start(today), -settings.MESSAGES_RETENTION_MONTHS)
+                expired = await _expired_partitions(conn, horizon)
+                await conn.commit()
+                for name in expired:
+                    report["archived"][name] = await archive_partition(name, Path(settings.MESSAGES_ARCHIVE_DIR))
+        finally:
+            await conn.rollback()
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": MAINTENANCE_LOCK})
+            await conn.commit()
+
+    return report
+
+
+class PartitionMaintenance:
+    """Периодическое обслуживание секций в процессе приложения"""
+
+    def __init__(self, interval_hours: float):
+        self.interval = interval_hours * 3600
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop(), name="partition-maintenance")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                report = await maintain_partitions()
+                if report["created"] or report["archived"]:
+                    logger.info("Messages partition maintenance: %s", report)
+            except Exception as e:
+                logger.warning("Messages partition maintenance failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+partition_maintenance = PartitionMaintenance(interval_hours=settings.PARTITION_MAINTENANCE_HOURS)
+
+
+async def main() -> None:
+    print(json.dumps(await maintain_partitions(), indent=2))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
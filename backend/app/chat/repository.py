@@ -0,0 +1,214 @@
+"""
+Горячий путь чата: запись хода разговора минимальным числом обращений к БД.
+
+Запросы идут напрямую через соединение asyncpg из сессии запроса:
+- каждый - один оператор (CTE объединяют проверку владельца, вставку и сводку
+  прогресса), вне явной транзакции он фиксируется сам, без BEGIN/COMMIT;
+- asyncpg кэширует подготовленные операторы на соединении, повторный вызов -
+  один обмен Bind/Execute без разбора SQL;
+- результат - записи asyncpg, а не ORM-объекты;
+- события движка эти операторы не видят, поэтому _run сам учитывает их в метриках
+  (app/core/metrics.py) и журнале медленных запросов.
+
+Если сессия уже открыла транзакцию (например, enqueue фоновой задачи), операторы
+выполняются в ней и фиксируются её commit.
+"""
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import record_query
+from app.core.slow_query import slow_query_log
+from app.progress.activity import STREAK_MIN_MESSAGES
+
+# Позиция, меньше любой реальной: (created_at разговора, нулевой UUID)
+_NIL_UUID = UUID(int=0)
+
+# Владелец, вставка сообщения пользователя, дневная сводка и серия дней - один оператор.
+# Если разговор чужой или не существует, CTE conversation пуст и ничего не вставляется.
+# $8 - вставлять, только если в разговоре ещё нет сообщений (ответ из кэша).
+# Вставка из CTE message подзапросам этого же оператора не видна: earlier видит только прежние сообщения
+START_TURN_SQL = """
+    WITH conversation AS (
+        SELECT c.conversation_id, c.created_at, c.summary, c.summary_message_id, c.summary_until,
+               EXISTS (
+                   SELECT 1 FROM messages m
+                   WHERE m.conversation_id = c.conversation_id AND m.created_at >= c.created_at
+               ) AS earlier
+        FROM conversations c
+        WHERE c.conversation_id = $1 AND c.user_id = $2
+    ),
+    message AS (
+        INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+        SELECT $3, conversation_id, 'user', $4, $5 FROM conversation
+        WHERE NOT ($8 AND earlier)
+        RETURNING message_id
+    ),
+    activity AS (
+        INSERT INTO user_daily_activity (user_id, day, user_messages)
+        SELECT $2, $6::date, 1 FROM message
+        ON CONFLICT (user_id, day) DO UPDATE SET user_messages = user_daily_activity.user_messages + 1
+        RETURNING user_messages
+    ),
+    streak AS (
+        UPDATE users
+        SET streak_days = CASE
+                WHEN users.streak_last_day = $6::date - 1 THEN users.streak_days + 1
+                WHEN users.streak_last_day = $6::date THEN users.streak_days
+                ELSE 1
+            END,
+            streak_last_day = $6::date
+        FROM activity
+        WHERE users.user_id = $2 AND activity.user_messages = $7
+        RETURNING users.user_id
+    )
+    SELECT conversation.*,
+           EXISTS (SELECT 1 FROM streak) AS streak_changed,
+           NOT conversation.earlier AS is_first_message,
+           EXISTS (SELECT 1 FROM message) AS saved
+    FROM conversation
+"""
+
+# История от новых к старым; нижняя граница created_at отсекает секции messages
+HISTORY_SQL = """
+    SELECT role, content, created_at, message_id FROM messages
+    WHERE conversation_id = $1 AND created_at >= $2 AND (created_at, message_id) > ($2, $3)
+    ORDER BY created_at DESC, message_id DESC
+    LIMIT $4
+"""
+
+HISTORY_BEFORE_SQL = """
+    SELECT role, content, created_at, message_id FROM messages
+    WHERE conversation_id = $1 AND created_at >= $2 AND (created_at, message_id) > ($2, $3)
+      AND created_at <= $4 AND (created_at, message_id) < ($4, $5)
+    ORDER BY created_at DESC, message_id DESC
+    LIMIT $6
+"""
+
+ADD_ASSISTANT_MESSAGE_SQL = """
+    WITH message AS (
+        INSERT INTO messages (message_id, conversation_id, role, content, created_at, generating)
+        VALUES ($1, $2, 'assistant', $3, $4, $5)
+    )
+    UPDATE conversations SET updated_at = $4 WHERE conversation_id = $2
+"""
+
+
+@dataclass
+class ConversationState:
+    """Поля разговора, нужные для сборки контекста (вместо ORM-объекта Conversation)"""
+    conversation_id: UUID
+    created_at: datetime
+    summary: Optional[str]
+    summary_message_id: Optional[UUID]
+    summary_until: Optional[datetime]
+
+
+@dataclass
+class UserTurn:
+    conversation: ConversationState
+    message_id: UUID
+    created_at: datetime
+    streak_changed: bool  # данные пользователя в кэше устарели
+    is_first_message: bool  # до этого в разговоре не было сообщений
+    saved: bool  # сообщение записано (first_only и разговор не новый - нет)
+
+
+async def _driver_connection(db: AsyncSession):
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    return raw_connection.driver_connection
+
+
+async def _run(db: AsyncSession, method: str, statement: str, *args):
+    """fetch/fetchrow/execute соединения asyncpg с учётом в метриках и журнале медленных запросов"""
+    connection = await _driver_connection(db)
+    started = time.perf_counter()
+    result = await getattr(connection, method)(statement, *args)
+    elapsed = time.perf_counter() - started
+    record_query(elapsed)
+    slow_query_log.record(statement, args, elapsed)
+    return result
+
+
+async def start_user_turn(
+        db: AsyncSession,
+        user_id: UUID,
+        conversation_id: UUID,
+        content: str,
+        first_only: bool = False
+) -> UserTurn | None:
+    """
+    Сохраняет сообщение пользователя, если разговор его; None - разговор не найден
+
+    first_only - только первое сообщение разговора: иначе ничего не записывается (saved=False).
+    """
+    message_id = uuid.uuid4()
+    created_at = datetime.now(timezone.utc)
+
+    row = await _run(
+        db, "fetchrow", START_TURN_SQL,
+        conversation_id, user_id, message_id, content, created_at, created_at.date(), STREAK_MIN_MESSAGES,
+        first_only,
+    )
+    if row is None:
+        return None
+
+    return UserTurn(
+        conversation=ConversationState(
+            conversation_id=row["conversation_id"],
+            created_at=row["created_at"],
+            summary=row["summary"],
+            summary_message_id=row["summary_message_id"],
+            summary_until=row["summary_until"],
+        ),
+        message_id=message_id,
+        created_at=created_at,
+        streak_changed=row["streak_changed"],
+        is_first_message=row["is_first_message"],
+        saved=row["saved"],
+    )
+
+
+async def history_batch(
+        db: AsyncSession,
+        conversation: ConversationState,
+        limit: int,
+        before: Tuple[datetime, UUID] | None = None
+) -> List:
+    """
+    Пачка сообщений (role, content, created_at, message_id) от новых к старым
+
+    Только после резюме разговора (если оно есть) и строго раньше before.
+    """
+    if conversation.summary_message_id is not None:
+        after = (conversation.summary_until, conversation.summary_message_id)
+    else:
+        after = (conversation.created_at, _NIL_UUID)
+
+    if before is None:
+        return await _run(db, "fetch", HISTORY_SQL, conversation.conversation_id, *after, limit)
+    return await _run(db, "fetch", HISTORY_BEFORE_SQL, conversation.conversation_id, *after, *before, limit)
+
+
+async def add_assistant_message(
+        db: AsyncSession,
+        conversation_id: UUID,
+        content: str,
+        generating: bool = False
+) -> Tuple[UUID, datetime]:
+    """
+    Сохраняет ответ AI и обновляет updated_at разговора; возвращает (message_id, created_at)
+
+    generating - запись под стрим: текст допишет генерация (app/chat/generations.py).
+    """
+    message_id = uuid.uuid4()
+    created_at = datetime.now(timezone.utc)
+
+    await _run(db, "execute", ADD_ASSISTANT_MESSAGE_SQL, message_id, conversation_id, content, created_at, generating)
+    return message_id, created_at
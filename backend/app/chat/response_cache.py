@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from typing import Dict, List, Protocol
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def make_cache_key(messages: List[Dict[str, str]], model: str, temperature: float, max_tokens: int) -> str:
+    """Хэш нормализованной истории (регистр и пробелы не важны) и параметров генерации"""
+    normalized = [
+        {"role": msg["role"], "content": _WHITESPACE.sub(" ", msg["content"]).strip().casefold()}
+        for msg in messages
+    ]
+    raw = json.dumps(
+        {"messages": normalized, "model": model, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache(Protocol):
+    async def get(self, key: str) -> str | None: ...
+
+    async def set(self, key: str, value: str) -> None: ...
+
+
+class MemoryResponseCache:
+    """Кэш ответов в памяти процесса"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> str | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self._cache.set(key, value)
+
+
+class SQLiteResponseCache:
+    """Кэш ответов в локальном SQLite-файле - переживает рестарт и общий для воркеров на одной машине"""
+
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_accessed_at ON llm_responses (accessed_at)")
+        self._lock = asyncio.Lock()
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now),
+        )
+        self._conn.execute("DELETE FROM llm_responses WHERE expires_at < ?", (now,))
+        # Вытесняем давно не использованные записи сверх лимита
+        self._conn.execute(
+            "DELETE FROM llm_responses WHERE key IN ("
+            "SELECT key FROM llm_responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    async def get(self, key: str) -> str | None:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value)
+
+
+def _create_response_cache() -> ResponseCache | None:
+    backend = settings.LLM_CACHE_BACKEND.lower()
+    if backend == "memory":
+        return MemoryResponseCache(maxsize=settings.LLM_CACHE_MAX_ENTRIES, ttl=settings.LLM_CACHE_TTL_SECONDS)
+    if backend == "sqlite":
+        return SQLiteResponseCache(
+            path=settings.LLM_CACHE_PATH,
+            maxsize=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL_SECONDS,
+        )
+    return None
+
+
+# None - кэш выключен (по умолчанию)
+response_cache = _create_response_cache()
+
+
+def is_cacheable(messages: List[Dict[str, str]]) -> bool:
+    """Кэшируем только короткие истории - длинные почти никогда не повторяются"""
+    return response_cache is not None and len(messages) <= settings.LLM_CACHE_MAX_MESSAGES
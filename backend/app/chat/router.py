@@ -1,26 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, func, tuple_
+from typing import Dict, List, Literal
 from uuid import UUID
 
-from app.core.database import get_db
-from app.auth.dependencies import get_current_user
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
+from app.core.pagination import encode_cursor, decode_cursor, encode_score_cursor, decode_score_cursor
+from app.core.etag import make_etag, conditional_response
+from app.core.singleflight import singleflight
+from app.core.metrics import sse_stream_duration, sse_frames, sse_llm_deltas, sse_writes_saved
+from app.core.serialization import json_response, rows_to_dicts
+from app.auth.dependencies import get_current_user, invalidate_user_cache
+from app.progress.activity import forget_user_message, forget_conversation_messages, STREAK_MIN_MESSAGES
+from app.progress.backfill import rebuild_streaks
 from app.models.user import User
-from app.models.conversation import Conversation, Message
+from app.models.conversation import Conversation, Message, SEARCH_CONFIG
 from app.chat.schemas import (
     MessageCreate, MessageResponse,
     ConversationCreate, ConversationResponse,
-    ConversationWithMessages,
+    ConversationPage, MessagePage,
+    SearchHit, SearchPage,
     ConversationUpdate
 )
+from contextlib import aclosing
 from datetime import datetime, timezone
-from app.chat.service import generate_ai_response, generate_ai_response_stream, generate_conversation_title
-import json
+from app.chat.tasks import enqueue_conversation_title
+from app.chat.export import export_ndjson, export_zip
+from app.chat.importer import ConversationImporter, ImportTooLarge, ndjson_lines, MAX_UPLOAD_BYTES
+from app.chat.repository import start_user_turn, add_assistant_message
+from app.chat.sse import start_frame, chunk_frame, error_frame, coalesce, StreamStats, DONE_FRAME
+from app.chat.generations import Generation, GenerationFailed, GenerationLimitReached, generations
+from app.chat.service import (
+    generate_ai_response, generate_ai_response_stream, generate_conversation_title,
+    cached_ai_response, replay_cached_response,
+    build_context, update_conversation_summary, estimate_request_tokens
+)
+from app.chat.scheduler import llm_scheduler, LLMSlot, LLMRequestRejected
+import math
+import time
 
 router = APIRouter()
 
+def llm_busy_exception(error: LLMRequestRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="AI tutor is busy right now, please retry shortly",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+async def acquire_llm_slot(user_id: UUID) -> LLMSlot:
+    """Место в очереди к LLM до записи чего-либо в БД: при отказе сообщение не сохраняется"""
+    try:
+        return await llm_scheduler.acquire(user_id, estimate_request_tokens())
+    except LLMRequestRejected as e:
+        raise llm_busy_exception(e)
+
+def first_turn_history(content: str) -> List[Dict[str, str]]:
+    """История первого сообщения разговора - только с ней ответ может оказаться в кэше"""
+    return [{"role": "user", "content": content}]
+
 @router.post("/conversations", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
         conversation: ConversationCreate,
@@ -39,37 +79,217 @@ async def create_conversation(
 
     return new_conversation
 
-@router.get("/conversations", response_model=List[ConversationResponse])
+@router.get("/conversations", response_model=ConversationPage)
 async def get_conversations(
+        request: Request,
+        response: Response,
+        limit: int = Query(50, ge=1, le=100),
+        cursor: str | None = None,
         current_user: User = Depends(get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
-    """Получить все разговоры пользователя"""
-    result = await db.execute(
-        select(Conversation)
+    """Получить разговоры пользователя (без сообщений), keyset-пагинация по (updated_at, conversation_id)"""
+    # Версия списка: последнее изменение и количество (index-only по user_id, updated_at)
+    version_result = await db.execute(
+        select(func.max(Conversation.updated_at), func.count())
         .where(Conversation.user_id == current_user.user_id)
-        .order_by(Conversation.updated_at.desc())
     )
-    conversations = result.scalars().all()
-    return conversations
+    last_updated, total = version_result.one()
+    not_modified = conditional_response(
+        request, response,
+        make_etag(last_updated, total, limit, cursor),
+        last_modified=last_updated
+    )
+    if not_modified:
+        return not_modified
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationWithMessages)
-async def get_conversation(
-        conversation_id: UUID,
+    query = (
+        select(Conversation.conversation_id, Conversation.title, Conversation.created_at, Conversation.updated_at)
+        .where(Conversation.user_id == current_user.user_id)
+        .order_by(Conversation.updated_at.desc(), Conversation.conversation_id.desc())
+        .limit(limit + 1)
+    )
+
+    if cursor:
+        cursor_updated_at, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(Conversation.updated_at, Conversation.conversation_id) < tuple_(cursor_updated_at, cursor_id)
+        )
+
+    result = await db.execute(query)
+    conversations = result.all()
+
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.updated_at, last.conversation_id)
+
+    return json_response(
+        {"items": rows_to_dicts(conversations, ConversationResponse.model_fields), "next_cursor": next_cursor},
+        response, ConversationPage
+    )
+
+# Фрагменты с совпадениями; выделение - markdown, его рендерит тот же компонент, что и сообщения
+SEARCH_HEADLINE_OPTIONS = 'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=25, MinWords=8, FragmentDelimiter=" … "'
+
+@router.get("/search", response_model=SearchPage)
+async def search_messages(
+        q: str = Query(..., min_length=1, max_length=200),
+        limit: int = Query(20, ge=1, le=50),
+        cursor: str | None = None,
         current_user: User = Depends(get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
+    """Полнотекстовый поиск по сообщениям пользователя, keyset-пагинация по (rank, message_id)"""
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank(Message.content_tsv, ts_query)
+
+    # GIN-индекс по content_tsv + владелец через conversations - одним запросом
+    hits = (
+        select(
+            Message.message_id,
+            Message.conversation_id,
+            Message.role,
+            Message.content,
+            Message.created_at,
+            Conversation.title.label("conversation_title"),
+            rank.label("rank"),
+        )
+        .join(Conversation, Conversation.conversation_id == Message.conversation_id)
+        .where(
+            Conversation.user_id == current_user.user_id,
+            Message.content_tsv.bool_op("@@")(ts_query)
+        )
+        .order_by(rank.desc(), Message.message_id.desc())
+        .limit(limit + 1)
+    )
 
-    from sqlalchemy.orm import selectinload
+    if cursor:
+        cursor_rank, cursor_id = decode_score_cursor(cursor)
+        hits = hits.where(tuple_(rank, Message.message_id) < tuple_(cursor_rank, cursor_id))
 
+    # ts_headline дорогой - считаем его только для строк страницы
+    page = hits.subquery()
     result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.conversation_id == conversation_id,
-            Conversation.user_id == current_user.user_id
+        select(
+            page.c.message_id,
+            page.c.conversation_id,
+            page.c.conversation_title,
+            page.c.role,
+            page.c.created_at,
+            page.c.rank,
+            func.ts_headline(SEARCH_CONFIG, page.c.content, ts_query, SEARCH_HEADLINE_OPTIONS).label("snippet"),
         )
+        .order_by(page.c.rank.desc(), page.c.message_id.desc())
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_score_cursor(last.rank, last.message_id)
+
+    return json_response(
+        {"items": rows_to_dicts(rows, SearchHit.model_fields), "next_cursor": next_cursor},
+        model=SearchPage
+    )
+
+@router.get("/export")
+async def export_history(
+        request: Request,
+        format: Literal["ndjson", "zip"] = "ndjson",
+        current_user: User = Depends(get_current_user)
+):
+    """Вся история пользователя потоком: NDJSON (с gzip, если клиент принимает) или zip с JSON на разговор"""
+    filename = f"educelo-export-{datetime.now(timezone.utc):%Y%m%d}"
+
+    if format == "zip":
+        return StreamingResponse(
+            export_zip(current_user.user_id),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'}
+        )
+
+    gzip = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.ndjson"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_ndjson(current_user.user_id, gzip=gzip),
+        media_type="application/x-ndjson",
+        headers=headers
     )
-    conversation = result.scalars().first()
+
+@router.post("/import")
+async def import_history(
+        request: Request,
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Импорт разговоров из NDJSON в аккаунт пользователя (формат - app/chat/importer.py)
+
+    Тело читается потоком; повторная загрузка того же файла ничего не дублирует.
+    Больше MAX_UPLOAD_BYTES или строка длиннее MAX_LINE_BYTES - 413, неверные данные - 422.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"upload exceeds {MAX_UPLOAD_BYTES} bytes"
+        )
+
+    # Секции messages из запроса пользователя не создаются, история - не раньше регистрации
+    importer = ConversationImporter(
+        source=f"upload:{current_user.user_id}",
+        user_id=current_user.user_id,
+        earliest=current_user.created_at,
+        create_partitions=False
+    )
+    try:
+        report = await importer.run(ndjson_lines(request.stream(), max_bytes=MAX_UPLOAD_BYTES))
+    except ImportTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        # Строки с ошибками пропускаются с отчётом; сюда доходят только данные, которые не удалось записать
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid import data: {e}"
+        )
+
+    # Серия дней могла измениться
+    invalidate_user_cache(current_user.user_id)
+    return report.as_dict()
+
+@router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
+async def get_conversation(
+        conversation_id: UUID,
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user)
+):
+    """Метаданные разговора, сообщения - через /conversations/{id}/messages"""
+    user_id = current_user.user_id
+
+    async def load() -> ConversationResponse | None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation)
+                .where(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.user_id == user_id
+                )
+            )
+            conversation = result.scalars().first()
+            return ConversationResponse.model_validate(conversation) if conversation else None
+
+    # Одновременные одинаковые запросы (несколько вкладок) делят один SELECT
+    conversation = await singleflight.do((user_id, "conversation", conversation_id), load)
 
     if not conversation:
         raise HTTPException(
@@ -77,162 +297,326 @@ async def get_conversation(
             detail="Conversation not found"
         )
 
+    not_modified = conditional_response(
+        request, response,
+        make_etag(conversation.conversation_id, conversation.title, conversation.updated_at),
+        last_modified=conversation.updated_at
+    )
+    if not_modified:
+        return not_modified
+
     return conversation
 
-@router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
-async def send_message(
-        conversation_id: str,
-        message: MessageCreate,
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
+async def get_messages(
+        conversation_id: UUID,
+        request: Request,
+        response: Response,
+        limit: int = Query(50, ge=1, le=200),
+        before: str | None = None,
+        after: str | None = None,
+        current_user: User = Depends(get_current_user)
 ):
-
-    result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.conversation_id == conversation_id,
-            Conversation.user_id == current_user.user_id
+    """История сообщений от новых к старым, keyset-пагинация по (created_at, message_id)"""
+    if before and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either 'before' or 'after', not both"
         )
-    )
-
-    conversation = result.scalars().first()
 
-    if not conversation:
+    before_position = decode_cursor(before) if before else None
+    after_position = decode_cursor(after) if after else None
+    user_id = current_user.user_id
+
+    async def load_version():
+        # Проверка владельца и версия истории (updated_at разговора + число сообщений) одним запросом.
+        # Сообщения не старше разговора - условие по created_at отсекает более ранние секции messages
+        message_count = (
+            select(func.count())
+            .where(
+                Message.conversation_id == Conversation.conversation_id,
+                Message.created_at >= Conversation.created_at
+            )
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation.updated_at, message_count, Conversation.created_at)
+                .where(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.user_id == user_id
+                )
+            )
+            return result.first()
+
+    version = await singleflight.do((user_id, "messages_version", conversation_id), load_version)
+    if version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
 
-    user_message = Message(
-        conversation_id=conversation_id,
-        role= "user",
-        content=message.content
+    not_modified = conditional_response(
+        request, response,
+        make_etag(conversation_id, *version, limit, before, after),
+        last_modified=version[0]
     )
+    if not_modified:
+        return not_modified
+
+    async def load_page() -> dict:
+        position = tuple_(Message.created_at, Message.message_id)
+        query = (
+            select(Message.message_id, Message.role, Message.content, Message.created_at)
+            .where(Message.conversation_id == conversation_id, Message.created_at >= version.created_at)
+            .limit(limit + 1)
+        )
 
-    db.add(user_message)
-    await db.commit()
+        # Отдельные условия на created_at рядом со сравнением кортежей - по ним отсекаются секции
+        if after_position:
+            # Новые сообщения: берём ближайшие к курсору по возрастанию, потом разворачиваем
+            query = query.where(
+                Message.created_at >= after_position[0], position > tuple_(*after_position)
+            ).order_by(Message.created_at, Message.message_id)
+        else:
+            query = query.order_by(Message.created_at.desc(), Message.message_id.desc())
+            if before_position:
+                query = query.where(
+                    Message.created_at <= before_position[0], position < tuple_(*before_position)
+                )
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            messages = result.all()
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_position:
+            messages.reverse()
+
+        before_cursor = None
+        if messages and (has_more or after_position):
+            oldest = messages[-1]
+            before_cursor = encode_cursor(oldest.created_at, oldest.message_id)
+
+        after_cursor = after
+        if messages:
+            newest = messages[0]
+            after_cursor = encode_cursor(newest.created_at, newest.message_id)
+
+        return {
+            "items": rows_to_dicts(messages, MessageResponse.model_fields),
+            "before_cursor": before_cursor,
+            "after_cursor": after_cursor,
+        }
 
-    messages_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
+    page = await singleflight.do(
+        (user_id, "messages", conversation_id, tuple(version), limit, before, after),
+        load_page
     )
+    return json_response(page, response, MessagePage)
 
-    all_messages = messages_result.scalars().all()
-
-    message_history = [
-        {"role": msg.role, "content": msg.content}
-        for msg in all_messages
-    ]
+@router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
+async def send_message(
+        conversation_id: UUID,
+        message: MessageCreate,
+        background_tasks: BackgroundTasks,
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    # Ответ из кэша не занимает очередь и бюджет LLM: слот берём, только если кэш промахнулся
+    cached = await cached_ai_response(first_turn_history(message.content))
+    slot = None if cached is not None else await acquire_llm_slot(current_user.user_id)
 
     try:
-        ai_response = await generate_ai_response(message_history)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error generating AI response: {str(e)}"
+        # Проверка владельца, сообщение пользователя и сводка прогресса - один запрос.
+        # Кэшированный ответ - только к первому сообщению: в другой разговор запроса не пишем,
+        # пока не получили слот LLM (отказ 429 не оставляет сообщения без ответа)
+        turn = await start_user_turn(
+            db, current_user.user_id, conversation_id, message.content, first_only=cached is not None
         )
+        if turn is not None and not turn.saved:
+            cached = None
+            slot = await acquire_llm_slot(current_user.user_id)
+            turn = await start_user_turn(db, current_user.user_id, conversation_id, message.content)
+        if turn is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        if turn.streak_changed:
+            invalidate_user_cache(current_user.user_id)
+
+        context = await build_context(db, turn.conversation)
+        if context.truncated_before:
+            # Резюме обновляется после ответа и не задерживает его
+            background_tasks.add_task(update_conversation_summary, conversation_id, context.truncated_before)
+        message_history = context.messages
+        if slot is not None:
+            slot.settle(estimate_request_tokens(message_history))
+
+        # Первое сообщение - название разговора сгенерирует фоновая задача
+        if turn.is_first_message:
+            await enqueue_conversation_title(db, conversation_id)
+        # Соединение не держим открытым, пока ждём OpenAI
+        await db.commit()
 
-    assistant_message = Message(
-        conversation_id=conversation_id,
-        role= "assistant",
-        content=ai_response
-    )
-    db.add(assistant_message)
+        try:
+            ai_response = cached if cached is not None else await generate_ai_response(message_history, slot=slot)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error generating AI response: {str(e)}"
+            )
 
-    from datetime import datetime, timezone
-    conversation.updated_at = datetime.now(timezone.utc)
+        message_id, created_at = await add_assistant_message(db, conversation_id, ai_response)
+        await db.commit()
 
-    await db.commit()
-    await db.refresh(assistant_message)
+        return MessageResponse(message_id=message_id, role="assistant", content=ai_response, created_at=created_at)
 
-    return assistant_message
+    finally:
+        if slot is not None:
+            slot.release()
 
 @router.post("/conversations/{conversation_id}/messages/stream")
 async def send_message_stream(
         conversation_id: UUID,
         message: MessageCreate,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_user),
         db: AsyncSession = Depends(get_db)
 ):
     """Отправить сообщение и получить ответ от AI в режиме streaming"""
+    # Место под генерацию резервируется до записи в БД: параллельные запросы не превысят лимит
+    try:
+        generations.reserve()
+    except GenerationLimitReached:
+        raise llm_busy_exception(LLMRequestRejected(retry_after=settings.LLM_MAX_QUEUE_WAIT_SECONDS))
 
-    # Проверяем существование разговора
-    result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.conversation_id == conversation_id,
-            Conversation.user_id == current_user.user_id
+    slot = None
+    try:
+        # Ответ из кэша не занимает очередь и бюджет LLM: слот берём, только если кэш промахнулся
+        cached = await cached_ai_response(first_turn_history(message.content))
+        if cached is None:
+            slot = await acquire_llm_slot(current_user.user_id)
+
+        # Проверка владельца, сообщение пользователя и сводка прогресса - один запрос.
+        # Кэшированный ответ - только к первому сообщению: в другой разговор запроса не пишем,
+        # пока не получили слот LLM (отказ 429 не оставляет сообщения без ответа)
+        turn = await start_user_turn(
+            db, current_user.user_id, conversation_id, message.content, first_only=cached is not None
         )
-    )
-    conversation = result.scalars().first()
-
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversation not found"
+        if turn is not None and not turn.saved:
+            cached = None
+            slot = await acquire_llm_slot(current_user.user_id)
+            turn = await start_user_turn(db, current_user.user_id, conversation_id, message.content)
+        if turn is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        if turn.streak_changed:
+            invalidate_user_cache(current_user.user_id)
+
+        # Получаем историю сообщений для контекста (в пределах бюджета токенов)
+        context = await build_context(db, turn.conversation)
+        if context.truncated_before:
+            # Резюме обновляется после ответа и не задерживает его
+            background_tasks.add_task(update_conversation_summary, conversation_id, context.truncated_before)
+        message_history = context.messages
+        if slot is not None:
+            slot.settle(estimate_request_tokens(message_history))
+
+        # Первое сообщение - название разговора сгенерирует фоновая задача
+        if turn.is_first_message:
+            await enqueue_conversation_title(db, conversation_id)
+
+        # Запись для ответа AI, контент накапливается по ходу стрима
+        assistant_message_id, assistant_created_at = await add_assistant_message(
+            db, conversation_id, "", generating=True
+        )
+        await db.commit()
+    except BaseException:
+        generations.cancel_reservation()
+        if slot is not None:
+            slot.release()
+        raise
+
+    # Возвращаем соединение в пул: стрим может идти десятки секунд
+    await db.close()
+
+    # Генерация идёт отдельной задачей: обрыв соединения её не останавливает,
+    # к ней можно переподключиться через GET .../messages/{message_id}/stream
+    generation = Generation(assistant_message_id, conversation_id, assistant_created_at, current_user.user_id)
+    if cached is not None:
+        generations.start(generation, replay_cached_response(cached), reserved=True)
+    else:
+        generations.start(
+            generation,
+            generate_ai_response_stream(message_history, slot=slot),
+            on_done=slot.release,
+            reserved=True
         )
 
-    # Сохраняем сообщение пользователя
-    user_message = Message(
-        conversation_id=conversation_id,
-        role="user",
-        content=message.content
-    )
-    db.add(user_message)
-    await db.commit()
-    await db.refresh(user_message)
-
-    # Получаем историю сообщений для контекста
-    messages_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at)
-    )
-    all_messages = messages_result.scalars().all()
-
-    # Формируем историю для OpenAI
-    message_history = [
-        {"role": msg.role, "content": msg.content}
-        for msg in all_messages
-    ]
-
-    # Создаём запись для ответа AI
-    assistant_message = Message(
-        conversation_id=conversation_id,
-        role="assistant",
-        content=""  # Будем накапливать контент
-    )
-    db.add(assistant_message)
-    await db.commit()
-    await db.refresh(assistant_message)
-
-    # Streaming функция
-    async def stream_response():
-        full_content = ""
-
-        try:
-            # Сначала отправляем ID сообщения
-            yield f"data: {json.dumps({'message_id': str(assistant_message.message_id), 'type': 'start'})}\n\n"
-
-            # Затем стримим контент
-            async for chunk in generate_ai_response_stream(message_history):
-                full_content += chunk
-                yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'})}\n\n"
+    return sse_response(generation_frames(generation))
 
-            # Сохраняем полный ответ в БД
-            assistant_message.content = full_content
-            conversation.updated_at = datetime.now(timezone.utc)
-            await db.commit()
+@router.get("/conversations/{conversation_id}/messages/{message_id}/stream")
+async def attach_message_stream(
+        conversation_id: UUID,
+        message_id: UUID,
+        last_event_id: str | None = Header(None),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Стрим ответа AI: подключение к идущей генерации (другая вкладка, переподключение)
 
-            # Отправляем финальное сообщение
-            yield f"data: [DONE]\n\n"
+    Last-Event-ID - id последнего полученного кадра: придёт только текст после него.
+    Завершённый ответ отдаётся из БД теми же кадрами. Генерация, которая идёт в другом
+    воркере (в БД - промежуточный текст), - 409 с Retry-After.
+    """
+    try:
+        position = max(0, int(last_event_id)) if last_event_id else 0
+    except ValueError:
+        position = 0
+
+    generation = generations.get(message_id)
+    if (
+        generation is not None
+        and generation.user_id == current_user.user_id
+        and generation.conversation_id == conversation_id
+    ):
+        return sse_response(generation_frames(generation, position))
+
+    # Соединение нужно только на одно чтение - стрим его не держит
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Message.role, Message.content, Message.generating, Message.created_at)
+            .join(Conversation, Conversation.conversation_id == Message.conversation_id)
+            .where(
+                Message.message_id == message_id,
+                Message.conversation_id == conversation_id,
+                Conversation.user_id == current_user.user_id
+            )
+        )
+        saved = result.first()
+    if saved is None or saved.role != "assistant":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found"
+        )
+    stale = (datetime.now(timezone.utc) - saved.created_at).total_seconds() > settings.GENERATION_STALE_SECONDS
+    if saved.generating and not stale:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Generation is still in progress, retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(settings.STREAM_CHECKPOINT_SECONDS)))}
+        )
 
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e), 'type': 'error'})}\n\n"
+    return sse_response(saved_message_frames(message_id, saved.content, position))
 
+def sse_response(frames) -> StreamingResponse:
     return StreamingResponse(
-        stream_response(),
+        frames,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -240,62 +624,107 @@ async def send_message_stream(
         }
     )
 
+async def generation_frames(generation: Generation, position: int = 0):
+    """Кадры SSE одного подписчика генерации, начиная с позиции position в тексте ответа"""
+    started_at = time.monotonic()
+    outcome = "disconnected"
+    stats = StreamStats()
+
+    try:
+        # Сначала отправляем ID сообщения
+        yield start_frame(generation.message_id)
+
+        # Затем стримим контент: куски склеиваются в кадры, в паузах - heartbeat
+        async with aclosing(coalesce(generation.follow(position), stats, position=position)) as frames:
+            async for frame in frames:
+                yield frame
+
+        # Ответ уже сохранён в БД - отправляем финальное сообщение
+        yield DONE_FRAME
+        outcome = "completed"
+
+    except GenerationFailed as e:
+        outcome = "error"
+        yield error_frame(str(e))
+
+    finally:
+        sse_stream_duration.observe(time.monotonic() - started_at, outcome)
+        sse_llm_deltas.inc(amount=stats.deltas)
+        sse_frames.inc("chunk", amount=stats.frames)
+        sse_frames.inc("heartbeat", amount=stats.heartbeats)
+        sse_writes_saved.observe(stats.writes_saved)
+
+async def saved_message_frames(message_id: UUID, content: str, position: int):
+    """Завершённый ответ из БД в формате стрима"""
+    yield start_frame(message_id)
+    if len(content) > position:
+        yield chunk_frame(content[position:], len(content))
+    yield DONE_FRAME
+
 @router.post("/conversations/{conversation_id}/generate-title", response_model=ConversationResponse)
 async def generate_title(
         conversation_id: UUID,
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        current_user: User = Depends(get_current_user)
 ):
     """Генерирует AI название для разговора на основе первого сообщения"""
+    user_id = current_user.user_id
+
+    async def generate() -> ConversationResponse:
+        async with AsyncSessionLocal() as db:
+            # Получаем разговор
+            result = await db.execute(
+                select(Conversation)
+                .where(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.user_id == user_id
+                )
+            )
+            conversation = result.scalars().first()
+
+            if not conversation:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found"
+                )
+
+            # Получаем первое сообщение пользователя
+            messages_result = await db.execute(
+                select(Message.content)
+                .where(Message.conversation_id == conversation_id, Message.role == "user")
+                .order_by(Message.created_at)
+                .limit(1)
+            )
+            first_message = messages_result.scalar()
+
+        if first_message is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No user messages found"
+            )
+
+        # Генерируем название через AI (соединение с БД не держим)
+        try:
+            new_title = await generate_conversation_title(first_message)
+        except LLMRequestRejected as e:
+            raise llm_busy_exception(e)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to generate title: {str(e)}"
+            )
+
+        # Обновляем название
+        async with AsyncSessionLocal() as db:
+            conversation.title = new_title
+            conversation.title_placeholder = False
+            conversation.updated_at = datetime.now(timezone.utc)
+            conversation = await db.merge(conversation)
+            await db.commit()
 
-    # Получаем разговор
-    result = await db.execute(
-        select(Conversation)
-        .where(
-            Conversation.conversation_id == conversation_id,
-            Conversation.user_id == current_user.user_id
-        )
-    )
-    conversation = result.scalars().first()
-
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversation not found"
-        )
-
-    # Получаем первое сообщение пользователя
-    messages_result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id, Message.role == "user")
-        .order_by(Message.created_at)
-        .limit(1)
-    )
-    first_message = messages_result.scalars().first()
-
-    if not first_message:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No user messages found"
-        )
-
-    # Генерируем название через AI
-    try:
-        new_title = await generate_conversation_title(first_message.content)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate title: {str(e)}"
-        )
-
-    # Обновляем название
-    conversation.title = new_title
-    conversation.updated_at = datetime.now(timezone.utc)
+            return ConversationResponse.model_validate(conversation)
 
-    await db.commit()
-    await db.refresh(conversation)
-
-    return conversation
+    # Двойной клик или несколько вкладок - один запрос к OpenAI
+    return await singleflight.do((user_id, "generate_title", conversation_id), generate)
 
 @router.patch("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def update_conversation(
@@ -321,6 +750,7 @@ async def update_conversation(
         )
 
     conversation.title = conversation_update.title
+    conversation.title_placeholder = False
     conversation.updated_at = datetime.now(timezone.utc)
 
     await db.commit()
@@ -350,9 +780,18 @@ async def delete_conversation(
             detail="Conversation not found"
         )
 
+    generations.discard_conversation(conversation_id)
+    # Сводка и серия - в той же транзакции, что и удаление (сообщения удаляются каскадом)
+    streak_changed = await forget_conversation_messages(
+        db, current_user.user_id, conversation_id, conversation.created_at
+    )
+    if streak_changed:
+        await rebuild_streaks(db, [current_user.user_id])
     await db.delete(conversation)
     await db.commit()
 
+    if streak_changed:
+        invalidate_user_cache(current_user.user_id)
     return None
 
 @router.delete("/conversations/{conversation_id}/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -395,7 +834,20 @@ async def delete_message(
             detail="Message not found"
         )
 
+    # Остановка ответа из интерфейса - удаление сообщения: генерацию прекращаем без сохранения
+    generations.discard(message_id)
     await db.delete(message)
+    streak_changed = False
+    if message.role == "user":
+        remaining = await forget_user_message(
+            db, current_user.user_id, message.created_at.astimezone(timezone.utc).date()
+        )
+        # День перестал засчитываться - серия могла прерваться
+        if remaining == STREAK_MIN_MESSAGES - 1:
+            await rebuild_streaks(db, [current_user.user_id])
+            streak_changed = True
     await db.commit()
 
+    if streak_changed:
+        invalidate_user_cache(current_user.user_id)
     return None
@@ -0,0 +1,198 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Hashable
+
+from app.core.config import settings
+
+# Очередь фоновых задач (названия, резюме) - отдельный «пользователь» в round-robin
+BACKGROUND_KEY = "background"
+
+
+class LLMRequestRejected(Exception):
+    """Ожидание в очереди превысило бы дедлайн - запрос к LLM не принят"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"LLM queue is full, retry after {self.retry_after}s")
+
+
+class LLMSlot:
+    """Разрешение на один запрос к LLM; release() обязателен"""
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int):
+        self._scheduler = scheduler
+        self.tokens = tokens
+        self.started_at = time.monotonic()
+        self._released = False
+
+    def settle(self, tokens: int) -> None:
+        """Уточняет число токенов запроса и возвращает излишек резерва в бюджет"""
+        if tokens < self.tokens:
+            self._scheduler._refund(self.tokens - tokens)
+            self.tokens = tokens
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self)
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class LLMScheduler:
+    """
+    Допуск исходящих запросов к LLM
+
+    Ограничивает число одновременных запросов и токены в минуту (token bucket),
+    очередь справедливая: пользователи обслуживаются по кругу, по одному запросу.
+    Если ожидание превысило бы max_wait, запрос сразу отклоняется с LLMRequestRejected.
+    """
+
+    def __init__(self, max_concurrent: int, tokens_per_minute: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.capacity = tokens_per_minute
+        self.max_wait = max_wait
+        self._rate = tokens_per_minute / 60
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._active = 0
+        self._queues: OrderedDict[Hashable, Deque[_Waiter]] = OrderedDict()
+        self._avg_duration = 5.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queued": self.queue_depth(),
+            "waiting_users": len(self._queues),
+            "tokens_available": int(self._tokens),
+            "tokens_per_minute": self.capacity,
+        }
+
+    async def acquire(self, key: Hashable, tokens: int) -> LLMSlot:
+        # Один запрос не может требовать больше, чем помещается в бюджет
+        tokens = min(tokens, self.capacity)
+        self._refill()
+
+        if not self._queues and self._active < self.max_concurrent and self._tokens >= tokens:
+            return self._grant(tokens)
+
+        wait = self._estimate_wait(tokens)
+        if wait > self.max_wait:
+            raise LLMRequestRejected(wait)
+
+        waiter = _Waiter(tokens=tokens)
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return waiter.future.result()
+            self._remove(key, waiter)
+            raise LLMRequestRejected(self._estimate_wait(tokens))
+        except asyncio.CancelledError:
+            # Клиент ушёл: возвращаем слот, если он уже был выдан
+            if waiter.future.done() and not waiter.future.cancelled():
+                waiter.future.result().release()
+            else:
+                self._remove(key, waiter)
+            raise
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable, tokens: int):
+        llm_slot = await self.acquire(key, tokens)
+        try:
+            yield llm_slot
+        finally:
+            llm_slot.release()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    def _estimate_wait(self, tokens: int) -> float:
+        queued = self.queue_depth()
+        ahead = self._active + queued + 1 - self.max_concurrent
+        concurrency_wait = max(0, ahead) / self.max_concurrent * self._avg_duration
+
+        queued_tokens = sum(waiter.tokens for queue in self._queues.values() for waiter in queue)
+        token_wait = max(0.0, queued_tokens + tokens - self._tokens) / self._rate
+
+        return max(concurrency_wait, token_wait)
+
+    def _grant(self, tokens: int) -> LLMSlot:
+        self._active += 1
+        self._tokens -= tokens
+        return LLMSlot(self, tokens)
+
+    def _refund(self, tokens: int) -> None:
+        self._tokens = min(self.capacity, self._tokens + tokens)
+        self._dispatch()
+
+    def _release(self, llm_slot: LLMSlot) -> None:
+        self._active -= 1
+        duration = time.monotonic() - llm_slot.started_at
+        self._avg_duration = 0.9 * self._avg_duration + 0.1 * duration
+        self._dispatch()
+
+    def _remove(self, key: Hashable, waiter: _Waiter) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[key]
+
+    def _dispatch(self) -> None:
+        self._refill()
+
+        while self._active < self.max_concurrent and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+
+            if self._tokens < waiter.tokens:
+                # Ждём пополнения бюджета
+                if self._timer is None:
+                    delay = (waiter.tokens - self._tokens) / self._rate
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+
+            queue.popleft()
+            # Round-robin: обслуженный пользователь уходит в конец очереди
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+
+            if not waiter.future.done():
+                waiter.future.set_result(self._grant(waiter.tokens))
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrent=settings.LLM_MAX_CONCURRENT,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    max_wait=settings.LLM_MAX_QUEUE_WAIT_SECONDS,
+)
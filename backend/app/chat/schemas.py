@@ -27,8 +27,27 @@ class ConversationResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class ConversationWithMessages(ConversationResponse):
-    messages: List[MessageResponse]
+class ConversationPage(BaseModel):
+    items: List[ConversationResponse]
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    items: List[MessageResponse]  # от новых к старым
+    before_cursor: Optional[str] = None  # передать в ?before= чтобы догрузить более старые
+    after_cursor: Optional[str] = None  # передать в ?after= чтобы получить новые
+
+class SearchHit(BaseModel):
+    message_id: UUID
+    conversation_id: UUID
+    conversation_title: str
+    role: str
+    snippet: str  # фрагменты с совпадениями, выделены **жирным** (markdown)
+    rank: float
+    created_at: datetime
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]  # от более релевантных к менее
+    next_cursor: Optional[str] = None
 
 class ConversationUpdate(BaseModel):
     title: str
\ No newline at end of file
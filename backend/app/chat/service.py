@@ -1,52 +1,292 @@
 import os
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from uuid import UUID
+
+import tiktoken
 from openai import AsyncOpenAI
-from typing import List, Dict, AsyncIterator
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, AsyncIterator, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import llm_time_to_first_token, llm_tokens_per_second
+from app.chat.response_cache import response_cache, make_cache_key, is_cacheable
+from app.chat.scheduler import llm_scheduler, LLMSlot, BACKGROUND_KEY
+from app.chat.repository import ConversationState, history_batch
+from app.models.conversation import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=settings.OPENAI_BASE_URL)
+
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
+SYSTEM_PROMPT = "You are a helpful AI tutor specializing in education. Provide clear, encouraging, and detailed explanations to help students learn effectively."
+
+# Служебные токены OpenAI на каждое сообщение (role, разделители)
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(content: str) -> int:
+    """Сколько токенов займёт сообщение с таким текстом (с учётом служебных)"""
+    return len(_get_encoding().encode(content)) + TOKENS_PER_MESSAGE
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-async def generate_ai_response(messages: List[Dict[str, str]]) -> str:
+def estimate_request_tokens(messages: List[Dict[str, str]] | None = None, max_tokens: int = MAX_TOKENS) -> int:
+    """Токены запроса для бюджета LLM: промпт + максимум ответа (без истории - верхняя граница)"""
+    if messages is None:
+        return settings.CONTEXT_TOKEN_BUDGET + max_tokens
+    return count_tokens(SYSTEM_PROMPT) + sum(count_tokens(msg["content"]) for msg in messages) + max_tokens
+
+
+@asynccontextmanager
+async def _llm_slot(slot: LLMSlot | None, tokens: int):
+    """Слот вызывающего, либо собственный слот в фоновой очереди планировщика"""
+    if slot is not None:
+        yield slot
+        return
+    async with llm_scheduler.slot(BACKGROUND_KEY, tokens):
+        yield
+
+
+@dataclass
+class ContextWindow:
+    messages: List[Dict[str, str]]
+    # Позиция (created_at, message_id) самого старого сообщения в окне, если более
+    # старые несуммаризованные сообщения в бюджет не влезли
+    truncated_before: Optional[Tuple[datetime, UUID]] = None
+
+
+def _summary_prefix(summary: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"Summary of the earlier part of this conversation:\n{summary}"}
+
+
+async def build_context(
+        db: AsyncSession,
+        conversation: ConversationState,
+        token_budget: int | None = None
+) -> ContextWindow:
     """
-    Генерирует ответ от AI на основе истории сообщений (без streaming)
+    Собирает историю для LLM в пределах бюджета токенов
+
+    Читает сообщения от новых к старым пачками (LIMIT) и останавливается, как только
+    следующее не влезает или начинается уже суммаризованная часть - её заменяет
+    резюме разговора. Бюджет включает system prompt и резюме, последнее сообщение
+    (сообщение пользователя) сохраняется всегда.
     """
+    budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    remaining = budget - count_tokens(SYSTEM_PROMPT)
+    batch_size = settings.CONTEXT_FETCH_BATCH
+
+    prefix = []
+    if conversation.summary:
+        prefix.append(_summary_prefix(conversation.summary))
+        remaining -= count_tokens(prefix[0]["content"])
+
+    selected: List[Dict[str, str]] = []
+    last_position = None
+
+    while True:
+        rows = await history_batch(db, conversation, batch_size, before=last_position)
+
+        for role, content, created_at, message_id in rows:
+            cost = count_tokens(content)
+            if selected and cost > remaining:
+                selected.reverse()
+                return ContextWindow(messages=prefix + selected, truncated_before=last_position)
+
+            selected.append({"role": role, "content": content})
+            remaining -= cost
+            last_position = (created_at, message_id)
+
+        if len(rows) < batch_size:
+            break
+
+    selected.reverse()
+    return ContextWindow(messages=prefix + selected)
+
+
+_summaries_in_progress: Set[UUID] = set()
+
+
+async def update_conversation_summary(conversation_id: UUID, window_start: Tuple[datetime, UUID]) -> None:
+    """
+    Фоновое инкрементальное обновление резюме разговора
+
+    Дописывает в резюме сообщения между последним суммаризованным и началом окна
+    контекста, если их накопилось не меньше SUMMARY_TRIGGER_MESSAGES. Версия резюме -
+    summary_message_id: обновление применяется, только если её никто не сдвинул.
+    """
+    if conversation_id in _summaries_in_progress:
+        return
+    _summaries_in_progress.add(conversation_id)
+
     try:
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI tutor specializing in education. Provide clear, encouraging, and detailed explanations to help students learn effectively."},
-                *messages
-            ],
-            temperature=0.7,
-            max_tokens=500
-        )
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(Conversation, conversation_id)
+            if conversation is None:
+                return
+
+            position = tuple_(Message.created_at, Message.message_id)
+            query = (
+                select(Message.role, Message.content, Message.created_at, Message.message_id)
+                .where(
+                    Message.conversation_id == conversation_id,
+                    Message.created_at >= (conversation.summary_until or conversation.created_at),
+                    Message.created_at <= window_start[0],
+                    position < tuple_(*window_start)
+                )
+                .order_by(Message.created_at, Message.message_id)
+                .limit(settings.SUMMARY_MAX_BATCH)
+            )
+            if conversation.summary_message_id is not None:
+                query = query.where(position > tuple_(conversation.summary_until, conversation.summary_message_id))
 
-        return response.choices[0].message.content
+            rows = (await db.execute(query)).all()
+            if len(rows) < settings.SUMMARY_TRIGGER_MESSAGES:
+                return
+
+            new_summary = await generate_conversation_summary(
+                conversation.summary,
+                [{"role": row.role, "content": row.content} for row in rows]
+            )
+            last = rows[-1]
+
+            await db.execute(
+                update(Conversation)
+                .where(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.summary_message_id.is_not_distinct_from(conversation.summary_message_id)
+                )
+                .values(summary=new_summary, summary_message_id=last.message_id, summary_until=last.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
 
     except Exception as e:
-        raise Exception(f"OpenAI API error: {str(e)}")
+        logger.warning("Failed to update summary for conversation %s: %s", conversation_id, e)
+
+    finally:
+        _summaries_in_progress.discard(conversation_id)
+
+
+async def cached_ai_response(messages: List[Dict[str, str]]) -> str | None:
+    """Готовый ответ из кэша (без обращения к планировщику и OpenAI) или None"""
+    if not is_cacheable(messages):
+        return None
+    return await response_cache.get(make_cache_key(messages, MODEL, TEMPERATURE, MAX_TOKENS))
+
 
+async def replay_cached_response(content: str) -> AsyncIterator[str]:
+    """Кэшированный ответ теми же кусочками, что и живой стрим"""
+    step = settings.LLM_CACHE_REPLAY_CHUNK_CHARS
+    for i in range(0, len(content), step):
+        yield content[i:i + step]
 
-async def generate_ai_response_stream(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+
+async def generate_ai_response(messages: List[Dict[str, str]], slot: LLMSlot | None = None) -> str:
+    """
+    Генерирует ответ от AI на основе истории сообщений (без streaming)
+
+    slot - разрешение планировщика, полученное вызывающим (иначе берётся фоновое)
+    """
+    cache_key = None
+    if is_cacheable(messages):
+        cache_key = make_cache_key(messages, MODEL, TEMPERATURE, MAX_TOKENS)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    async with _llm_slot(slot, estimate_request_tokens(messages)):
+        try:
+            response = await client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    *messages
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS
+            )
+
+            content = response.choices[0].message.content
+
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+
+    if cache_key is not None and content:
+        await response_cache.set(cache_key, content)
+
+    return content
+
+
+async def generate_ai_response_stream(messages: List[Dict[str, str]], slot: LLMSlot | None = None) -> AsyncIterator[str]:
     """
     Генерирует ответ от AI с потоковой передачей (streaming)
+
+    slot - разрешение планировщика, полученное вызывающим (иначе берётся фоновое)
     """
-    try:
-        stream = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI tutor specializing in education. Provide clear, encouraging, and detailed explanations to help students learn effectively."},
-                *messages
-            ],
-            temperature=0.7,
-            max_tokens=500,
-            stream=True  # Включаем streaming
-        )
+    cache_key = None
+    if is_cacheable(messages):
+        cache_key = make_cache_key(messages, MODEL, TEMPERATURE, MAX_TOKENS)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            async for chunk in replay_cached_response(cached):
+                yield chunk
+            return
 
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+    chunks: List[str] = []
+    first_token_at = None
 
-    except Exception as e:
-        raise Exception(f"OpenAI API error: {str(e)}")
+    async with _llm_slot(slot, estimate_request_tokens(messages)):
+        requested_at = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    *messages
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                stream=True  # Включаем streaming
+            )
+
+            async for chunk in stream:
+                if chunk.choices[0].delta.content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        llm_time_to_first_token.observe(first_token_at - requested_at)
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+
+        # OpenAI присылает по одному токену в delta - число кусков и есть число токенов
+        generation_time = time.perf_counter() - first_token_at if first_token_at else 0
+        if generation_time > 0:
+            llm_tokens_per_second.observe(len(chunks) / generation_time)
+
+    # Кэшируем только полностью полученный ответ
+    if cache_key is not None and chunks:
+        await response_cache.set(cache_key, "".join(chunks))
 
 async def generate_conversation_title(first_message: str) -> str:
     """
@@ -58,9 +298,12 @@ async def generate_conversation_title(first_message: str) -> str:
     Returns:
         str: Короткое название разговора (макс 50 символов)
     """
+    # Отказ планировщика пробрасывается (фоновая задача повторит позже), остальные ошибки - fallback
+    title_slot = await llm_scheduler.acquire(BACKGROUND_KEY, count_tokens(first_message) + 100)
+
     try:
         response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=MODEL,
             messages=[
                 {
                     "role": "system",
@@ -92,3 +335,44 @@ async def generate_conversation_title(first_message: str) -> str:
         if len(first_message) > 50:
             fallback_title += "..."
         return fallback_title
+
+    finally:
+        title_slot.release()
+
+
+async def generate_conversation_summary(previous_summary: str | None, messages: List[Dict[str, str]]) -> str:
+    """
+    Дополняет резюме разговора новыми сообщениями
+
+    Args:
+        previous_summary: Текущее резюме (None, если его ещё нет)
+        messages: Сообщения, которые нужно добавить в резюме
+
+    Returns:
+        str: Обновлённое резюме
+    """
+    transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+
+    tokens = count_tokens(transcript) + count_tokens(previous_summary or "") + 300
+    async with _llm_slot(None, tokens):
+        try:
+            response = await client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You maintain a running summary of a tutoring conversation. Merge the new messages into the existing summary. Keep the topics covered, what the student already understands or struggles with, and any open questions. Be concise (at most 200 words). Return ONLY the summary."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+                    }
+                ],
+                temperature=0.3,
+                max_tokens=300
+            )
+
+            return response.choices[0].message.content.strip()
+
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
@@ -0,0 +1,143 @@
+"""
+Кадры SSE стрима ответа AI.
+
+Шаблоны кадров закодированы заранее: на каждый чанк кодируется только его текст
+(одна JSON-строка), без сборки и сериализации словаря. Формат прежний:
+    data: {"message_id": "...", "type": "start"}
+    id: <позиция>            (необязательно)
+    data: {"content": "...", "type": "chunk"}
+    data: {"error": "...", "type": "error"}
+    data: [DONE]
+
+coalesce склеивает куски ответа LLM (по 1-3 символа) в кадры: меньше кадров,
+кодирований и записей в сокет, фронтенд просто получает более длинные content.
+В паузах стрим шлёт комментарий ": ping" (читатели SSE его пропускают), чтобы
+прокси не закрывали соединение, пока модель думает.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.serialization import dumps
+
+_START_PREFIX = b'data: {"message_id": '
+_START_SUFFIX = b', "type": "start"}\n\n'
+_CHUNK_PREFIX = b'data: {"content": '
+_CHUNK_SUFFIX = b', "type": "chunk"}\n\n'
+_ERROR_PREFIX = b'data: {"error": '
+_ERROR_SUFFIX = b', "type": "error"}\n\n'
+
+DONE_FRAME = b"data: [DONE]\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def start_frame(message_id: UUID) -> bytes:
+    return b'%s"%s"%s' % (_START_PREFIX, str(message_id).encode(), _START_SUFFIX)
+
+
+def chunk_frame(content: str, event_id: int | None = None) -> bytes:
+    frame = _CHUNK_PREFIX + dumps(content) + _CHUNK_SUFFIX
+    return frame if event_id is None else b"id: %d\n%s" % (event_id, frame)
+
+
+def error_frame(error: str) -> bytes:
+    return _ERROR_PREFIX + dumps(error) + _ERROR_SUFFIX
+
+
+@dataclass
+class StreamStats:
+    deltas: int = 0  # куски от LLM
+    frames: int = 0  # кадры с текстом
+    heartbeats: int = 0
+
+    @property
+    def writes_saved(self) -> int:
+        return self.deltas - self.frames
+
+
+async def coalesce(
+        deltas: AsyncIterator[str],
+        stats: StreamStats,
+        interval: float = settings.SSE_COALESCE_MS / 1000,
+        max_bytes: int = settings.SSE_COALESCE_BYTES,
+        heartbeat: float = settings.SSE_HEARTBEAT_SECONDS,
+        position: int | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Кадры chunk из кусков deltas: не позже interval после первого куска в буфере
+    или как только набралось max_bytes; после heartbeat секунд тишины - HEARTBEAT_FRAME
+
+    position - позиция первого куска в тексте ответа: кадры получают id с позицией
+    после себя, клиент передаёт её в Last-Event-ID при переподключении.
+    """
+    buffer: List[str] = []
+    size = 0
+    flush_at = 0.0
+    idle_since = time.monotonic()
+    # Следующий кусок ждём задачей: таймаут не должен прерывать сам генератор
+    pending: asyncio.Future | None = None
+
+    def flush() -> bytes:
+        nonlocal size, idle_since, position
+        text = "".join(buffer)
+        if position is not None:
+            position += len(text)
+        frame = chunk_frame(text, position)
+        buffer.clear()
+        size = 0
+        stats.frames += 1
+        idle_since = time.monotonic()
+        return frame
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(deltas))
+
+            if buffer:
+                timeout = max(0.0, flush_at - time.monotonic())
+            elif heartbeat:
+                timeout = max(0.0, idle_since + heartbeat - time.monotonic())
+            else:
+                timeout = None
+
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                if buffer:
+                    yield flush()
+                else:
+                    stats.heartbeats += 1
+                    idle_since = time.monotonic()
+                    yield HEARTBEAT_FRAME
+                continue
+
+            task, pending = pending, None
+            try:
+                delta = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # Клиент получает всё, что успели сгенерировать, затем - ошибку
+                if buffer:
+                    yield flush()
+                raise
+
+            stats.deltas += 1
+            if not buffer:
+                flush_at = time.monotonic() + interval
+            buffer.append(delta)
+            size += len(delta.encode())
+            if size >= max_bytes or time.monotonic() >= flush_at:
+                yield flush()
+
+        if buffer:
+            yield flush()
+
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await deltas.aclose()
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.jobs.runner import job_handler, enqueue
+from app.models.conversation import Conversation, Message
+from app.chat.service import generate_conversation_title
+
+CONVERSATION_TITLE_JOB = "conversation_title"
+
+
+async def enqueue_conversation_title(db: AsyncSession, conversation_id: UUID) -> None:
+    """Ставит автогенерацию названия - не больше одной задачи на разговор"""
+    await enqueue(
+        db,
+        CONVERSATION_TITLE_JOB,
+        {"conversation_id": str(conversation_id)},
+        dedupe_key=f"{CONVERSATION_TITLE_JOB}:{conversation_id}",
+    )
+
+
+@job_handler(CONVERSATION_TITLE_JOB, max_concurrency=2)
+async def generate_title_job(payload: dict) -> None:
+    """Называет разговор по первому сообщению пользователя, если название ещё не заменено"""
+    conversation_id = UUID(payload["conversation_id"])
+
+    async with AsyncSessionLocal() as db:
+        placeholder = await db.scalar(
+            select(Conversation.title_placeholder).where(Conversation.conversation_id == conversation_id)
+        )
+        if not placeholder:
+            # Разговор удалён или уже переименован - OpenAI не вызываем
+            return
+
+        result = await db.execute(
+            select(Message.content)
+            .where(Message.conversation_id == conversation_id, Message.role == "user")
+            .order_by(Message.created_at)
+            .limit(1)
+        )
+        first_message = result.scalar()
+
+    if first_message is None:
+        return
+
+    # Соединение с БД не держим, пока ждём OpenAI
+    title = await generate_conversation_title(first_message)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id == conversation_id, Conversation.title_placeholder)
+            .values(title=title, title_placeholder=False, updated_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
@@ -8,6 +8,87 @@ class Settings(BaseSettings):
     DATABASE_URL: str
 
     openai_api_key: str
+    # Другой OpenAI-совместимый сервер, например benchmarks/fake_openai.py для нагрузочных тестов
+    OPENAI_BASE_URL: str | None = None
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+
+    # Контекст для LLM: бюджет токенов на промпт (system + история)
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_FETCH_BATCH: int = 50
+
+    # Резюме обновляется, когда за окном контекста накопилось столько новых сообщений
+    SUMMARY_TRIGGER_MESSAGES: int = 10
+    SUMMARY_MAX_BATCH: int = 100
+
+    # Кэш проверенных токенов и пользователей в get_current_user
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
+    # Argon2: параметры хэша и пул потоков, в котором он считается
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Промежуточное сохранение ответа AI во время стрима (0 - только в конце)
+    STREAM_CHECKPOINT_SECONDS: float = 0
+
+    # SSE: куски ответа склеиваются в один кадр на SSE_COALESCE_MS мс или до SSE_COALESCE_BYTES
+    # байт (что раньше; 0 мс - кадр на каждый кусок), пауза дольше SSE_HEARTBEAT_SECONDS - ": ping"
+    SSE_COALESCE_MS: float = 30
+    SSE_COALESCE_BYTES: int = 2048
+    SSE_HEARTBEAT_SECONDS: float = 15
+
+    # Сколько генераций ответа (с буфером для переподключения) может идти в процессе одновременно
+    GENERATION_MAX_BUFFERED: int = 200
+    # Ответ, помеченный generating дольше этого, считается брошенным (воркер упал) и отдаётся как есть
+    GENERATION_STALE_SECONDS: int = 600
+
+    # Фоновые задачи (app/jobs)
+    JOBS_WORKERS: int = 4
+    JOBS_POLL_SECONDS: float = 1.0
+    JOBS_LOCK_TIMEOUT_SECONDS: int = 300
+
+    # Кэш ответов LLM: "" (выключен), "memory" или "sqlite"
+    LLM_CACHE_BACKEND: str = ""
+    LLM_CACHE_PATH: str = "llm_cache.sqlite3"
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_TTL_SECONDS: int = 86400
+    LLM_CACHE_MAX_MESSAGES: int = 1
+    LLM_CACHE_REPLAY_CHUNK_CHARS: int = 16
+
+    # Допуск запросов к OpenAI: общий лимит параллельных запросов и токенов в минуту
+    LLM_MAX_CONCURRENT: int = 20
+    LLM_TOKENS_PER_MINUTE: int = 90000
+    LLM_MAX_QUEUE_WAIT_SECONDS: float = 20
+
+    # Журнал медленных запросов (выключен по умолчанию): порог, доля проверяемых запросов,
+    # EXPLAIN (ANALYZE, BUFFERS) для самых медленных чтений (EXPLAIN для изменений) и размер кольцевого буфера
+    DB_ECHO: bool = False
+    SLOW_QUERY_LOG: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    SLOW_QUERY_EXPLAIN: bool = False
+    SLOW_QUERY_BUFFER_SIZE: int = 50
+
+    # Секции messages по месяцам: сколько создавать заранее, через сколько месяцев
+    # выгружать в архив (0 - хранить всё) и как часто проверять
+    MESSAGES_PARTITIONS_AHEAD: int = 3
+    MESSAGES_RETENTION_MONTHS: int = 0
+    MESSAGES_ARCHIVE_DIR: str = "archive/messages"
+    PARTITION_MAINTENANCE_HOURS: float = 12
+
+    # Быстрый JSON (orjson): класс ответа по умолчанию и кодирование списков прямо из строк БД
+    FAST_JSON: bool = False
+
+    # Email администраторов через запятую (доступ к /api/v1/admin)
+    ADMIN_EMAILS: str = ""
+    # /metrics, /health/pool и /health/llm без авторизации - только если порт закрыт от внешней сети
+    # (иначе нужен токен администратора)
+    OPS_ENDPOINTS_PUBLIC: bool = False
 
     class Config:
         env_file = ".env"
@@ -1,13 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.slow_query import slow_query_log
 
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
+    echo=settings.DB_ECHO,
     future=True,
     pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
 )
+instrument_engine(engine)
+if settings.SLOW_QUERY_LOG:
+    slow_query_log.install(engine)
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -28,3 +35,13 @@ async def get_db():
             raise
         finally:
             await session.close()
+
+def pool_status() -> dict:
+    """Текущее состояние пула соединений"""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
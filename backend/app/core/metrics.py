@@ -0,0 +1,269 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+# Границы по умолчанию (секунды) - как у prometheus_client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in list(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (последняя - +Inf), сумма]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Счётчики храним по корзинам, накопительные суммы считаются только при выдаче
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Значение снимается в момент выдачи метрик (состояние пула, очереди)"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {self.callback()}"]
+
+
+class Registry:
+    """
+    Метрики процесса в текстовом формате Prometheus
+
+    Значения меняются только из потока event loop (middleware, события движка
+    asyncpg, генераторы стримов), поэтому блокировки не нужны: обновление - это
+    одна операция над словарём без await посередине.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+)
+db_queries = registry.counter("db_queries_total", "SQL statements executed")
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement execution time")
+db_queries_per_request = registry.histogram(
+    "http_request_db_queries", "SQL statements per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50),
+)
+db_time_per_request = registry.histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request", ("route",),
+)
+llm_time_to_first_token = registry.histogram(
+    "llm_time_to_first_token_seconds", "Time from OpenAI request to first streamed token",
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+llm_tokens_per_second = registry.histogram(
+    "llm_tokens_per_second", "Streaming generation speed after the first token",
+    buckets=(5, 10, 20, 30, 40, 60, 80, 120, 200),
+)
+sse_stream_duration = registry.histogram(
+    "sse_stream_duration_seconds", "Duration of SSE response streams", ("outcome",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+sse_frames = registry.counter("sse_frames_total", "SSE frames written to clients", ("kind",))
+sse_llm_deltas = registry.counter("sse_llm_deltas_total", "LLM deltas received for SSE streams")
+sse_writes_saved = registry.histogram(
+    "sse_writes_saved", "Frames (socket writes) saved per SSE response by coalescing",
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 2000),
+)
+
+
+class _RequestDBStats:
+    __slots__ = ("scope", "queries", "seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Счётчики SQL текущего запроса; объект общий для задач, порождённых запросом (стрим ответа)
+_request_db_stats: ContextVar[_RequestDBStats | None] = ContextVar("request_db_stats", default=None)
+
+
+def _route_of(scope: dict) -> str:
+    # Шаблон пути (/conversations/{conversation_id}), а не сам путь - иначе метки не ограничены
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def current_route() -> str | None:
+    """Маршрут HTTP-запроса, в контексте которого выполняется код (None - фоновые задачи)"""
+    stats = _request_db_stats.get()
+    if stats is None:
+        return None
+    return f"{stats.scope['method']} {_route_of(stats.scope)}"
+
+
+def record_query(elapsed: float) -> None:
+    """Учитывает выполненный SQL-оператор (в том числе выполненный напрямую через asyncpg)"""
+    db_queries.inc()
+    db_query_duration.observe(elapsed)
+
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def discard_query_start(exception_context, key: str) -> None:
+    """Снимает отметку начала упавшего оператора из conn.info[key] (если она ещё там)"""
+    connection = exception_context.connection
+    if connection is None or exception_context.cursor is None:
+        return
+    stack = connection.info.get(key)
+    if stack and stack[-1][0] is exception_context.cursor:
+        stack.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Подключает учёт SQL-запросов и показатели пула к движку"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append((cursor, time.perf_counter()))
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info["query_start"].pop()
+        record_query(time.perf_counter() - started)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        # Упавший оператор не дошёл до after_cursor_execute - убираем его отметку,
+        # иначе стек на долгоживущем соединении растёт
+        discard_query_start(exception_context, "query_start")
+
+    pool = engine.pool
+    registry.gauge("db_pool_size", "Configured connection pool size", pool.size)
+    registry.gauge("db_pool_checked_out", "Connections currently checked out", pool.checkedout)
+    registry.gauge("db_pool_overflow", "Overflow connections currently open", lambda: max(pool.overflow(), 0))
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность и число SQL-запросов по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestDBStats(scope)
+        token = _request_db_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_db_stats.reset(token)
+            route = _route_of(scope)
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route, status_code)
+            db_queries_per_request.observe(stats.queries, route)
+            db_time_per_request.observe(stats.seconds, route)
@@ -3,8 +3,14 @@ from argon2.exceptions import VerifyMismatchError
 import jwt
 from jwt.exceptions import InvalidTokenError
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
 from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from app.core.config import settings
 
 load_dotenv()
 
@@ -12,7 +18,20 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-ph = PasswordHasher()
+ph = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Argon2 отпускает GIL, поэтому хэширование в потоках не блокирует event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="argon2",
+)
+# Задачи в пуле (в очереди и выполняемые); уменьшается по завершении самой задачи в потоке
+_pending_password_jobs = 0
+_pending_password_lock = threading.Lock()
 
 def hash_password(password: str) -> str:
     return ph.hash(password)
@@ -24,6 +43,59 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except VerifyMismatchError:
         return False
 
+def _verify_and_rehash(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if ph.check_needs_rehash(hashed_password):
+        return True, ph.hash(plain_password)
+    return True, None
+
+def _password_job_done(_future) -> None:
+    global _pending_password_jobs
+    with _pending_password_lock:
+        _pending_password_jobs -= 1
+
+async def _run_password_job(func, *args):
+    """
+    Выполняет Argon2 в пуле потоков, 503 если очередь переполнена
+
+    Место освобождает сама задача: отменённый запрос (клиент отключился) не отменяет
+    уже начатый хэш, и тот продолжает считаться в лимите.
+    """
+    global _pending_password_jobs
+
+    with _pending_password_lock:
+        if _pending_password_jobs >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        _pending_password_jobs += 1
+
+    try:
+        future = _password_executor.submit(func, *args)
+    except BaseException:
+        _password_job_done(None)
+        raise
+    future.add_done_callback(_password_job_done)
+    return await asyncio.wrap_future(future)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Проверяет пароль вне event loop
+
+    Returns:
+        tuple[bool, str | None]: Совпал ли пароль и новый хэш, если параметры Argon2 изменились
+    """
+    return await _run_password_job(_verify_and_rehash, plain_password, hashed_password)
+
+def shutdown_password_executor() -> None:
+    _password_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
 
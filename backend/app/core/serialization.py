@@ -0,0 +1,79 @@
+"""
+Быстрая сериализация JSON для списков и SSE.
+
+Включается FAST_JSON (нужен orjson, без него - прежний путь):
+- FastJSONResponse - класс ответа по умолчанию, рендерит через orjson;
+- списки (разговоры, сообщения, поиск, тепловая карта) кодируются из строк БД
+  прямо в байты, без промежуточных pydantic-моделей и jsonable_encoder.
+
+Форма ответа та же, что у схем в response_model (они остаются для документации).
+Кадры SSE (app/chat/sse.py) кодируются через dumps независимо от FAST_JSON.
+"""
+import json
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, Sequence
+from uuid import UUID
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson в requirements.txt, но путь без него остаётся рабочим
+    orjson = None
+
+FAST_JSON = settings.FAST_JSON and orjson is not None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        # Как pydantic: UTC - с суффиксом Z
+        text = value.isoformat()
+        return text[:-6] + "Z" if value.utcoffset() == timezone.utc.utcoffset(None) else text
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """JSON в байтах; UUID и datetime - в том же виде, что отдаёт pydantic"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с рендерингом через orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows: Iterable, fields: Sequence[str]) -> list[dict]:
+    """Строки результата (Row, ORM-объекты) -> словари с полями схемы"""
+    return [{name: getattr(row, name) for name in fields} for row in rows]
+
+
+def json_response(
+        payload: dict,
+        response: Response | None = None,
+        model: type[BaseModel] | None = None
+) -> Any:
+    """
+    Ответ эндпоинта-списка: готовые байты (FAST_JSON) или, как раньше, модель/словарь
+
+    Заголовки из response (ETag, Last-Modified) переносятся: FastAPI не применяет их
+    к Response, возвращённому напрямую.
+    """
+    if not FAST_JSON:
+        return model(**payload) if model is not None else payload
+    return Response(
+        content=dumps(payload),
+        media_type="application/json",
+        headers=dict(response.headers) if response is not None else None,
+    )
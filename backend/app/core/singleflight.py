@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых одновременных операций
+
+    Пока операция с ключом выполняется, остальные вызовы с тем же ключом ждут её
+    результат (или исключение) вместо повторного запуска. Операция не привязана к
+    запросу, который её начал: если он отменён, остальные всё равно получат результат.
+    Поэтому операция должна открывать свою сессию БД и возвращать данные, которые
+    безопасно разделять (pydantic-модели, словари, кортежи), а не ORM-объекты.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Исключение уже получили ожидающие; если их не осталось - не логируем как потерянное
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+singleflight = SingleFlight()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Set
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import current_route, discard_query_start
+
+logger = logging.getLogger("app.slow_query")
+
+_EXPLAINABLE_PREFIXES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# EXPLAIN ANALYZE выполняет запрос - с ANALYZE повторяем только чтение: SELECT или WITH
+# без изменяющих данные частей (WITH ... INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE).
+# Остальное - EXPLAIN без выполнения
+_READ_ONLY_PREFIXES = ("SELECT", "WITH")
+_WRITE_KEYWORDS = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b")
+_EXPLAIN_TIMEOUT_MS = 10000
+
+
+def _normalize(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def _is_read_only(normalized: str) -> bool:
+    upper = normalized.upper()
+    return upper.startswith(_READ_ONLY_PREFIXES) and _WRITE_KEYWORDS.search(upper) is None
+
+
+def _param_shape(parameters, executemany: bool) -> str:
+    """Типы параметров без значений - в журнал не попадают пароли и тексты сообщений"""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {_param_shape(rows[0], False)}" if rows else "0 x ()"
+
+    if isinstance(parameters, dict):
+        items = [f"{key}: {_type_name(value)}" for key, value in parameters.items()]
+        return "{" + ", ".join(items) + "}"
+
+    return "(" + ", ".join(_type_name(value) for value in parameters or ()) + ")"
+
+
+def _type_name(value) -> str:
+    name = type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{name}[{len(value)}]"
+    return name
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных запросов
+
+    recent - кольцевой буфер последних запросов дольше порога,
+    plans - планы самых медленных различных запросов: EXPLAIN (ANALYZE, BUFFERS) для
+    чтения, EXPLAIN для изменений (не больше buffer_size, при переполнении вытесняется
+    самый быстрый).
+    """
+
+    def __init__(self, threshold_ms: float, sample_rate: float, explain: bool, buffer_size: int):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.explain = explain
+        self.buffer_size = buffer_size
+        self.recent: Deque[dict] = deque(maxlen=buffer_size)
+        self.plans: Dict[str, dict] = {}
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._engine = None
+
+    def install(self, engine) -> None:
+        self._engine = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine.sync_engine, "handle_error", self._handle_error)
+
+    def snapshot(self) -> dict:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "sample_rate": self.sample_rate,
+            "recent": list(reversed(self.recent)),
+            "plans": sorted(self.plans.values(), key=lambda plan: plan["duration_ms"], reverse=True),
+        }
+
+    def clear(self) -> None:
+        self.recent.clear()
+        self.plans.clear()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        conn.info.setdefault("slow_query_start", []).append((cursor, time.perf_counter() if sampled else None))
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info["slow_query_start"].pop()
+        if started is None:
+            return
+        self._check(statement, parameters, time.perf_counter() - started, executemany)
+
+    def _handle_error(self, exception_context):
+        discard_query_start(exception_context, "slow_query_start")
+
+    def record(self, statement: str, parameters: tuple, elapsed: float) -> None:
+        """
+        Оператор, выполненный напрямую через asyncpg (app/chat/repository.py) мимо событий движка
+
+        parameters - позиционные ($1, $2...), план снимается тоже через asyncpg.
+        """
+        if self._engine is None:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        self._check(statement, parameters, elapsed, False, raw=True)
+
+    def _check(self, statement: str, parameters, elapsed: float, executemany: bool, raw: bool = False) -> None:
+        if elapsed < self.threshold or statement.startswith("EXPLAIN"):
+            return
+
+        normalized = _normalize(statement)
+        record = {
+            "statement": normalized,
+            "params": _param_shape(parameters, executemany),
+            "duration_ms": round(elapsed * 1000, 2),
+            "route": current_route(),
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.recent.append(record)
+        logger.warning(
+            "Slow query %.1f ms [%s] params=%s: %s",
+            record["duration_ms"], record["route"] or "background", record["params"], normalized,
+        )
+
+        if self.explain and not executemany and self._should_explain(normalized, record["duration_ms"]):
+            self._explaining.add(normalized)
+            # План снимаем отдельным соединением, не задерживая запрос, который его вызвал
+            task = asyncio.get_running_loop().create_task(self._capture_plan(statement, parameters, record, raw))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _should_explain(self, normalized: str, duration_ms: float) -> bool:
+        if normalized in self._explaining or not normalized.upper().startswith(_EXPLAINABLE_PREFIXES):
+            return False
+
+        known = self.plans.get(normalized)
+        if known is not None:
+            return duration_ms > known["duration_ms"]
+        if len(self.plans) < self.buffer_size:
+            return True
+        return duration_ms > min(plan["duration_ms"] for plan in self.plans.values())
+
+    async def _capture_plan(self, statement: str, parameters, record: dict, raw: bool = False) -> None:
+        normalized = record["statement"]
+        analyze = _is_read_only(normalized)
+        explain = f"EXPLAIN (ANALYZE, BUFFERS) {statement}" if analyze else f"EXPLAIN {statement}"
+        try:
+            async with self._engine.connect() as conn:
+                # Транзакция не фиксируется: откат при выходе из connect()
+                await conn.exec_driver_sql(f"SET LOCAL statement_timeout = {_EXPLAIN_TIMEOUT_MS}")
+                if raw:
+                    raw_connection = await conn.get_raw_connection()
+                    rows = await raw_connection.driver_connection.fetch(explain, *parameters)
+                else:
+                    rows = (await conn.exec_driver_sql(explain, parameters)).all()
+                plan = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            logger.info("EXPLAIN failed for slow query: %s", e)
+            return
+        finally:
+            self._explaining.discard(normalized)
+
+        self.plans[normalized] = {**record, "analyzed": analyze, "plan": plan}
+        if len(self.plans) > self.buffer_size:
+            fastest = min(self.plans, key=lambda key: self.plans[key]["duration_ms"])
+            del self.plans[fastest]
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    sample_rate=settings.SLOW_QUERY_SAMPLE_RATE,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    buffer_size=settings.SLOW_QUERY_BUFFER_SIZE,
+)
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+from sqlalchemy import event, select, update, or_, and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class _Registration:
+    handler: JobHandler
+    max_concurrency: int | None
+
+
+_handlers: Dict[str, _Registration] = {}
+
+
+def job_handler(kind: str, max_concurrency: int | None = None):
+    """Регистрирует обработчик задач вида kind (не больше max_concurrency одновременно в процессе)"""
+    def decorator(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = _Registration(handler=handler, max_concurrency=max_concurrency)
+        return handler
+    return decorator
+
+
+async def enqueue(
+        db: AsyncSession,
+        kind: str,
+        payload: Dict[str, Any],
+        dedupe_key: str | None = None,
+        max_attempts: int = 3
+) -> None:
+    """
+    Ставит задачу в очередь в транзакции вызывающего (commit делает он)
+
+    С dedupe_key задача создаётся не больше одного раза, повторы - no-op. Воркеры
+    будятся после commit: до него строка задачи им не видна.
+    """
+    stmt = insert(BackgroundJob).values(
+        kind=kind,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        max_attempts=max_attempts,
+    )
+    if dedupe_key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[BackgroundJob.dedupe_key])
+
+    await db.execute(stmt)
+    event.listen(db.sync_session, "after_commit", lambda _session: runner.wake(), once=True)
+
+
+class JobRunner:
+    """Пул asyncio-воркеров, разбирающих таблицу background_jobs"""
+
+    def __init__(self, workers: int, poll_interval: float, lock_timeout: int):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        self._running: Dict[str, int] = defaultdict(int)
+        self._next_sweep = 0.0
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"job-worker-{i}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning("Failed to claim background job: %s", e)
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Статус не записан (например, оборвалось соединение) - задачу подберёт
+                # повторный захват по lock_timeout, воркер продолжает работу
+                logger.exception("Background job %s (%s) crashed the worker: %s", job.job_id, job.kind, e)
+            finally:
+                self._running[job.kind] -= 1
+
+    def _available_kinds(self) -> List[str]:
+        return [
+            kind for kind, registration in _handlers.items()
+            if registration.max_concurrency is None or self._running[kind] < registration.max_concurrency
+        ]
+
+    async def _claim(self):
+        # Захват сериализован внутри процесса, чтобы не превысить лимиты по видам задач;
+        # между процессами задачи делит FOR UPDATE SKIP LOCKED
+        async with self._claim_lock:
+            if time.monotonic() >= self._next_sweep:
+                await self._fail_exhausted()
+                self._next_sweep = time.monotonic() + min(self.lock_timeout, 60)
+
+            kinds = self._available_kinds()
+            if not kinds:
+                return None
+
+            now = datetime.now(timezone.utc)
+            candidate = (
+                select(BackgroundJob.job_id)
+                .where(
+                    BackgroundJob.kind.in_(kinds),
+                    BackgroundJob.run_at <= now,
+                    or_(
+                        BackgroundJob.status == "pending",
+                        # Задача зависла в упавшем процессе; исчерпавшая попытки больше не берётся
+                        and_(
+                            BackgroundJob.status == "running",
+                            BackgroundJob.locked_at < now - timedelta(seconds=self.lock_timeout),
+                            BackgroundJob.attempts < BackgroundJob.max_attempts
+                        )
+                    )
+                )
+                .order_by(BackgroundJob.run_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(BackgroundJob)
+                    .where(BackgroundJob.job_id == candidate)
+                    .values(status="running", attempts=BackgroundJob.attempts + 1, locked_at=func.now())
+                    .returning(
+                        BackgroundJob.job_id, BackgroundJob.kind, BackgroundJob.payload,
+                        BackgroundJob.attempts, BackgroundJob.max_attempts
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                job = result.first()
+                await db.commit()
+
+            if job is not None:
+                self._running[job.kind] += 1
+            return job
+
+    async def _fail_exhausted(self) -> None:
+        """Зависшие задачи, исчерпавшие попытки, - failed: повторный захват их уже не возьмёт"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.status == "running",
+                    BackgroundJob.locked_at < func.now() - timedelta(seconds=self.lock_timeout),
+                    BackgroundJob.attempts >= BackgroundJob.max_attempts
+                )
+                .values(status="failed", locked_at=None, last_error="Lock timed out on the last attempt")
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        if result.rowcount:
+            logger.warning("Marked %s stale background jobs as failed", result.rowcount)
+
+    async def _run(self, job) -> None:
+        values: Dict[str, Any] = {"status": "done", "locked_at": None, "last_error": None}
+
+        try:
+            await _handlers[job.kind].handler(job.payload)
+        except Exception as e:
+            logger.warning("Background job %s (%s) failed, attempt %s: %s", job.job_id, job.kind, job.attempts, e)
+            values["last_error"] = str(e)
+            if job.attempts < job.max_attempts:
+                # Экспоненциальная пауза перед повтором: 2, 4, 8... секунд
+                values["status"] = "pending"
+                values["run_at"] = datetime.now(timezone.utc) + timedelta(seconds=2 ** job.attempts)
+            else:
+                values["status"] = "failed"
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.job_id == job.job_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+
+runner = JobRunner(
+    workers=settings.JOBS_WORKERS,
+    poll_interval=settings.JOBS_POLL_SECONDS,
+    lock_timeout=settings.JOBS_LOCK_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base
+
+
+class UserDailyActivity(Base):
+    """Число сообщений пользователя за день - обновляется вместе со вставкой сообщения"""
+    __tablename__ = "user_daily_activity"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    user_messages = Column(Integer, nullable=False, default=0)
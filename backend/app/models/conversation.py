@@ -1,32 +1,71 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
-from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, Index, Computed, text, false
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from app.core.database import Base
 from datetime import datetime, timezone
 import uuid
 
+# Конфигурация полнотекстового поиска: колонка и запросы обязаны использовать одну и ту же
+SEARCH_CONFIG = "english"
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
     conversation_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255), nullable=False)
+    # Название задано при создании и ещё не заменено (автоназванием или пользователем);
+    # импорт и существующие строки - false через server_default
+    title_placeholder = Column(Boolean, nullable=False, default=True, server_default=false())
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
+    # Скользящее резюме старой части разговора (всё до summary_message_id включительно)
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(UUID(as_uuid=True), nullable=True)
+    summary_until = Column(TIMESTAMP(timezone=True), nullable=True)  # created_at сообщения summary_message_id
+
     # Relationships
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", lazy="selectin")  # Добавили lazy="selectin"
+    # Сообщения читаются постранично через /conversations/{id}/messages - случайный доступ падает, а не тянет всю историю
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="Message.created_at",
+        lazy="raise",
+    )
 
 
 class Message(Base):
     __tablename__ = "messages"
+    # Секции по месяцам created_at (см. alembic/versions/0007_partition_messages.py, app/chat/partitions.py)
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     message_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.conversation_id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Ключ секционирования входит в первичный ключ
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), primary_key=True)
+    # Ответ AI ещё генерируется стримом, content - промежуточный (см. app/chat/generations.py)
+    generating = Column(Boolean, nullable=False, default=False, server_default=false())
+
+    # Поисковый вектор считает PostgreSQL (см. 0006_message_search.py); при загрузке сообщений не читается
+    content_tsv = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True)))
 
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+
+
+# Индексы горячих путей (см. alembic/versions/0002_hot_path_indexes.py, 0007 - те же на секциях)
+Index("ix_conversations_user_id_updated_at", Conversation.user_id, Conversation.updated_at.desc())
+Index("ix_messages_conversation_id_created_at", Message.conversation_id, Message.created_at)
+Index(
+    "ix_messages_user_role_conversation_id_created_at",
+    Message.conversation_id,
+    Message.created_at,
+    postgresql_where=text("role = 'user'"),
+)
+Index("ix_messages_content_tsv", Message.content_tsv, postgresql_using="gin")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, Integer, Text, Index, text
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP, JSONB
+from app.core.database import Base
+from datetime import datetime, timezone
+import uuid
+
+
+class BackgroundJob(Base):
+    """Фоновая задача, которую выполняет app.jobs.runner"""
+    __tablename__ = "background_jobs"
+
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    # pending -> running -> done | failed (после max_attempts неудачных попыток)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # Одна задача на ключ: повторная постановка - no-op
+    dedupe_key = Column(String(255), unique=True, nullable=True)
+    last_error = Column(Text, nullable=True)
+    run_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    locked_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+Index("ix_background_jobs_queue", BackgroundJob.run_at, postgresql_where=text("status IN ('pending', 'running')"))
@@ -16,6 +16,9 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     weekly_goal_hours = Column(Integer, default=10)
     goal_last_updated = Column(Date, default=None, nullable=True)
+    # Серия дней подряд с активностью, хранится инкрементально (см. app/chat/repository.py, app/progress/activity.py)
+    streak_days = Column(Integer, default=0, server_default="0", nullable=False)
+    streak_last_day = Column(Date, default=None, nullable=True)
 
     # Relationships
     conversations = relationship("Conversation", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
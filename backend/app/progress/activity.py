@@ -0,0 +1,70 @@
+from datetime import date, datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.activity import UserDailyActivity
+from app.models.user import User
+
+# Сколько сообщений за день нужно, чтобы день засчитался в серию
+# (учёт нового сообщения - в START_TURN_SQL, app/chat/repository.py)
+STREAK_MIN_MESSAGES = 3
+
+# Сообщения пользователя удаляемого разговора по дням - вычитаются из сводки одним оператором;
+# результат - дни, которые перестали засчитываться в серию
+FORGET_CONVERSATION_SQL = """
+    WITH deleted AS (
+        SELECT (created_at AT TIME ZONE 'UTC')::date AS day, count(*) AS user_messages
+        FROM messages
+        WHERE conversation_id = :conversation_id AND created_at >= :conversation_created_at AND role = 'user'
+        GROUP BY day
+    )
+    UPDATE user_daily_activity a
+    SET user_messages = greatest(a.user_messages - deleted.user_messages, 0)
+    FROM deleted
+    WHERE a.user_id = :user_id AND a.day = deleted.day
+    RETURNING a.user_messages < :min_messages AND a.user_messages + deleted.user_messages >= :min_messages
+"""
+
+
+def activity_day() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+async def forget_user_message(db: AsyncSession, user_id: UUID, day: date) -> int | None:
+    """Убирает удалённое сообщение пользователя из дневной статистики; возвращает новый счётчик дня"""
+    result = await db.execute(
+        update(UserDailyActivity)
+        .where(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day == day,
+            UserDailyActivity.user_messages > 0,
+        )
+        .values(user_messages=UserDailyActivity.user_messages - 1)
+        .returning(UserDailyActivity.user_messages)
+    )
+    return result.scalar_one_or_none()
+
+
+async def forget_conversation_messages(
+        db: AsyncSession,
+        user_id: UUID,
+        conversation_id: UUID,
+        conversation_created_at: datetime
+) -> bool:
+    """Убирает сообщения пользователя удаляемого разговора из дневной статистики; True - серию надо пересчитать"""
+    result = await db.execute(text(FORGET_CONVERSATION_SQL), {
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "conversation_created_at": conversation_created_at,
+        "min_messages": STREAK_MIN_MESSAGES,
+    })
+    return any(result.scalars())
+
+
+def current_streak(user: User, today: date) -> int:
+    """Серия считается от сегодняшнего дня: если сегодня норма не выполнена - серии нет"""
+    if user.streak_last_day == today:
+        return user.streak_days or 0
+    return 0
@@ -0,0 +1,84 @@
+"""
+Пересчёт user_daily_activity и серий дней по существующим сообщениям.
+
+Запуск (идемпотентно, можно повторять):
+    python -m app.progress.backfill
+"""
+import asyncio
+from typing import Sequence
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.database import engine
+from app.progress.activity import STREAK_MIN_MESSAGES
+
+BACKFILL_ACTIVITY_SQL = """
+    INSERT INTO user_daily_activity (user_id, day, user_messages)
+    SELECT c.user_id, (m.created_at AT TIME ZONE 'UTC')::date AS day, count(*)
+    FROM messages m JOIN conversations c ON c.conversation_id = m.conversation_id
+    WHERE m.role = 'user'
+    GROUP BY c.user_id, day
+    ON CONFLICT (user_id, day) DO UPDATE SET user_messages = EXCLUDED.user_messages
+"""
+
+# Острова подряд идущих засчитанных дней, для каждого пользователя - последний
+BACKFILL_STREAK_SQL = """
+    WITH qualified AS (
+        SELECT user_id, day,
+               day - (row_number() OVER (PARTITION BY user_id ORDER BY day))::int AS island
+        FROM user_daily_activity
+        WHERE user_messages >= :min_messages {user_filter}
+    ),
+    islands AS (
+        SELECT user_id, max(day) AS last_day, count(*) AS days
+        FROM qualified
+        GROUP BY user_id, island
+    ),
+    latest AS (
+        SELECT DISTINCT ON (user_id) user_id, last_day, days
+        FROM islands
+        ORDER BY user_id, last_day DESC
+    )
+    UPDATE users u
+    SET streak_days = latest.days, streak_last_day = latest.last_day
+    FROM latest
+    WHERE u.user_id = latest.user_id
+"""
+
+# Пользователи без засчитанных дней не попадают в BACKFILL_STREAK_SQL
+RESET_STREAK_SQL = """
+    UPDATE users SET streak_days = 0, streak_last_day = NULL
+    WHERE user_id = ANY(:user_ids)
+"""
+
+
+async def rebuild_streaks(
+        conn: AsyncConnection | AsyncSession,
+        user_ids: Sequence[UUID] | None = None
+) -> int:
+    """Пересчитывает серии по user_daily_activity (всех пользователей или только user_ids)"""
+    params = {"min_messages": STREAK_MIN_MESSAGES}
+    user_filter = ""
+    if user_ids is not None:
+        user_filter = "AND user_id = ANY(:user_ids)"
+        params["user_ids"] = list(user_ids)
+        # Серия могла прерваться совсем (например, после удаления сообщений)
+        await conn.execute(text(RESET_STREAK_SQL), {"user_ids": params["user_ids"]})
+
+    result = await conn.execute(text(BACKFILL_STREAK_SQL.format(user_filter=user_filter)), params)
+    return result.rowcount
+
+
+async def backfill() -> None:
+    async with engine.begin() as conn:
+        activity = await conn.execute(text(BACKFILL_ACTIVITY_SQL))
+        streaks = await rebuild_streaks(conn)
+
+    print(f"user_daily_activity rows: {activity.rowcount}, streaks updated: {streaks}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
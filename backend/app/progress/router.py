@@ -1,83 +1,68 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy import select, func
-from datetime import datetime, timedelta, date
-from typing import Dict, List
+from datetime import timedelta
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
+from app.core.etag import make_etag, conditional_response
+from app.core.singleflight import singleflight
+from app.core.serialization import json_response
 from app.auth.dependencies import get_current_user
 from app.models.user import User
-from app.models.conversation import Message, Conversation
+from app.models.activity import UserDailyActivity
+from app.progress.activity import activity_day, current_streak
 
 router = APIRouter()
 
 @router.get("/stats")
 async def get_user_stats(
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user)
 ):
-    # Get all study time
-    total_messages_result = await db.execute(
-        select(func.count(Message.message_id))
-        .join(Conversation)
-        .where(Conversation.user_id == current_user.user_id)
-        .where(Message.role == "user")
+    today = activity_day()
+    start_of_week = today - timedelta(days=today.weekday())
+
+    user_id = current_user.user_id
+
+    async def load_totals():
+        # Всё время и текущая неделя - одним запросом по дневной сводке
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    func.coalesce(func.sum(UserDailyActivity.user_messages), 0).label('total'),
+                    func.coalesce(
+                        func.sum(UserDailyActivity.user_messages).filter(UserDailyActivity.day >= start_of_week), 0
+                    ).label('weekly'),
+                )
+                .where(UserDailyActivity.user_id == user_id)
+            )
+            return result.one()
+
+    # Дашборд опрашивают несколько виджетов и вкладок одновременно - один запрос на всех
+    totals = await singleflight.do((user_id, "progress_stats", today), load_totals)
+
+    # Ответ зависит только от сводки, цели, серии и текущей даты
+    streak = current_streak(current_user, today)
+    not_modified = conditional_response(
+        request, response,
+        make_etag(today, totals.total, totals.weekly, current_user.weekly_goal_hours, streak)
     )
-    total_messages = total_messages_result.scalar() or 0
+    if not_modified:
+        return not_modified
+
+    # Get all study time
+    total_messages = totals.total
     total_study_minutes = total_messages * 2
     total_study_hours = total_study_minutes / 60
 
     # Weekly goal
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
-
-    weekly_messages_result = await db.execute(
-        select(func.count(Message.message_id))
-        .join(Conversation)
-        .where(Conversation.user_id == current_user.user_id)
-        .where(Message.role == "user")
-        .where(func.date(Message.created_at) >= start_of_week)
-    )
-    weekly_messages = weekly_messages_result.scalar() or 0
+    weekly_messages = totals.weekly
     weekly_study_minutes = weekly_messages * 2
     weekly_study_hours = weekly_study_minutes / 60
 
     weekly_goal = current_user.weekly_goal_hours or 10
     goal_progress = min(int((weekly_study_hours / weekly_goal) * 100), 100)
 
-    #Day streak
-
-    year_ago = today - timedelta(days=365)
-
-    dates_result = await db.execute(
-        select(
-            func.date(Message.created_at).label('date'),
-            func.count(Message.message_id).label('count')
-        )
-        .join(Conversation)
-        .where(Conversation.user_id == current_user.user_id)
-        .where(Message.role == "user")
-        .where(func.date(Message.created_at) >= year_ago)
-        .group_by(func.date(Message.created_at))
-        .order_by(func.date(Message.created_at).desc())
-    )
-
-    activity_dates = {row.date: row.count for row in dates_result.all()}
-
-    #Count streak
-    streak = 0
-    current_check_date = today
-
-    while current_check_date >= year_ago:
-        message_count = activity_dates.get(current_check_date, 0)
-
-        if message_count >= 3:
-            streak += 1
-            current_check_date -= timedelta(days=1)
-        else:
-            #Break the streak if there is no activity
-            break
-
     return {
         "study_time": {
             "hours": round(total_study_hours, 1),
@@ -98,31 +83,39 @@ async def get_user_stats(
 
 @router.get("/activity")
 async def get_activity_heatmap(
-        current_user: User = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user)
 ):
     #Get data for heatmap for 52 weeks
-    end_date = date.today()
+    end_date = activity_day()
     start_date = end_date - timedelta(days=363)
 
-    result = await db.execute(
-        select(
-            func.date(Message.created_at).label('date'),
-            func.count(Message.message_id).label('count')
-        )
-        .join(Conversation)
-        .where(Conversation.user_id == current_user.user_id)
-        .where(Message.role == "user")
-        .where(func.date(Message.created_at) >= start_date)
-        .group_by(func.date(Message.created_at))
-    )
+    user_id = current_user.user_id
 
-    activity_map = {str(row.date): row.count for row in result.all()}
+    async def load_activity():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(UserDailyActivity.day, UserDailyActivity.user_messages)
+                .where(UserDailyActivity.user_id == user_id)
+                .where(UserDailyActivity.day >= start_date)
+            )
+            return {row.day: row.user_messages for row in result.all()}
+
+    activity_map = await singleflight.do((user_id, "progress_activity", end_date), load_activity)
+
+    # Версия - сами дневные счётчики (до 364 строк), 304 до построения ответа
+    not_modified = conditional_response(
+        request, response,
+        make_etag(end_date, *sorted(activity_map.items()))
+    )
+    if not_modified:
+        return not_modified
 
     daily_activity = []
     current = start_date
     while current <= end_date:
-        count = activity_map.get(str(current), 0)
+        count = activity_map.get(current, 0)
         daily_activity.append({
             "date": str(current),
             "count": count,
@@ -130,10 +123,10 @@ async def get_activity_heatmap(
         })
         current += timedelta(days=1)
 
-    return {
+    return json_response({
         "activity": daily_activity,
         "total_days": len(daily_activity)
-    }
+    }, response)
 
 def get_activity_level(count: int) -> str:
     if count == 0:
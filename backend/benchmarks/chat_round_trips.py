@@ -0,0 +1,188 @@
+"""
+Обращения к БД и латентность записи хода разговора: ORM-последовательность,
+как в send_message до app/chat/repository.py, против репозитория.
+
+Соединение идёт через локальный TCP-прокси, который считает обмены с PostgreSQL:
+обмен - каждая посылка клиента после ответа сервера. Вызов OpenAI не входит.
+
+Запуск (на отдельной БД, создаёт и удаляет своего пользователя):
+    alembic upgrade head
+    python -m benchmarks.chat_round_trips --turns 500
+
+Результаты (PostgreSQL 16.2 локально по TCP, 1 vCPU, миграции до 0009, история до
+50 сообщений, три прогона по 500-1000 ходов):
+    path              round trips    p50 ms    p99 ms
+    legacy (ORM)             13.0  6.5-7.1  10.5-14.3
+    repository                3.0  1.9-2.3    3.7-4.0
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.chat.repository import start_user_turn, history_batch, add_assistant_message
+from app.models.activity import UserDailyActivity
+from app.models.conversation import Conversation, Message
+from app.models.user import User
+
+USER_CONTENT = "Can you explain how photosynthesis works?"
+ASSISTANT_CONTENT = "Photosynthesis converts light energy into chemical energy. " * 10
+HISTORY_LIMIT = 50
+
+
+class RoundTripProxy:
+    """TCP-прокси до PostgreSQL, считающий обмены запрос-ответ"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.round_trips = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection(self.host, self.port)
+        state = {"client_turn": False}
+
+        async def pipe(reader, writer, from_client: bool):
+            try:
+                while data := await reader.read(65536):
+                    if from_client and not state["client_turn"]:
+                        self.round_trips += 1
+                    state["client_turn"] = from_client
+                    writer.write(data)
+                    await writer.drain()
+            finally:
+                writer.close()
+
+        await asyncio.gather(
+            pipe(client_reader, server_writer, True),
+            pipe(server_reader, client_writer, False),
+            return_exceptions=True,
+        )
+
+
+async def legacy_turn(db: AsyncSession, user_id, conversation_id) -> None:
+    """Последовательность прежнего send_message: ORM-объекты, refresh, две транзакции"""
+    result = await db.execute(
+        select(Conversation).where(Conversation.conversation_id == conversation_id, Conversation.user_id == user_id)
+    )
+    conversation = result.scalars().first()
+
+    db.add(Message(conversation_id=conversation_id, role="user", content=USER_CONTENT))
+    await db.execute(
+        insert(UserDailyActivity)
+        .values(user_id=user_id, day=datetime.now(timezone.utc).date(), user_messages=1)
+        .on_conflict_do_update(
+            index_elements=[UserDailyActivity.user_id, UserDailyActivity.day],
+            set_={"user_messages": UserDailyActivity.user_messages + 1},
+        )
+    )
+    await db.commit()
+
+    await db.execute(
+        select(Message.role, Message.content, Message.created_at, Message.message_id)
+        .where(Message.conversation_id == conversation_id, Message.created_at >= conversation.created_at)
+        .order_by(Message.created_at.desc(), Message.message_id.desc())
+        .limit(HISTORY_LIMIT)
+    )
+
+    assistant_message = Message(conversation_id=conversation_id, role="assistant", content=ASSISTANT_CONTENT)
+    db.add(assistant_message)
+    conversation.updated_at = datetime.now(timezone.utc)
+    await db.commit()
+    await db.refresh(assistant_message)
+
+
+async def repository_turn(db: AsyncSession, user_id, conversation_id) -> None:
+    turn = await start_user_turn(db, user_id, conversation_id, USER_CONTENT)
+    await history_batch(db, turn.conversation, HISTORY_LIMIT)
+    await add_assistant_message(db, conversation_id, ASSISTANT_CONTENT)
+    await db.commit()
+
+
+async def run(name, turn, sessions, proxy, user_id, conversation_id, turns: int, warmup: int) -> dict:
+    # Прогрев: соединение, кэш подготовленных операторов
+    for _ in range(warmup):
+        async with sessions() as db:
+            await turn(db, user_id, conversation_id)
+
+    proxy.round_trips = 0
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        async with sessions() as db:
+            await turn(db, user_id, conversation_id)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return {
+        "name": name,
+        "round_trips": proxy.round_trips / turns,
+        "p50": statistics.median(timings),
+        "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+async def main(args) -> None:
+    url = make_url(settings.DATABASE_URL)
+    proxy = RoundTripProxy(url.host or "127.0.0.1", url.port or 5432)
+    proxy_port = await proxy.start()
+
+    engine = create_async_engine(url.set(host="127.0.0.1", port=proxy_port), pool_size=1, max_overflow=0)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    user_id = uuid.uuid4()
+    conversations = {name: uuid.uuid4() for name in ("legacy", "repository")}
+    async with sessions() as db:
+        db.add(User(
+            user_id=user_id,
+            username=f"bench_{user_id.hex[:12]}",
+            email=f"bench_{user_id.hex[:12]}@example.com",
+            hashed_password="x",
+            is_active=True,
+        ))
+        await db.flush()
+        for conversation_id in conversations.values():
+            db.add(Conversation(conversation_id=conversation_id, user_id=user_id, title="Round trip benchmark"))
+        await db.commit()
+
+    try:
+        results = [
+            await run("legacy (ORM)", legacy_turn, sessions, proxy, user_id,
+                      conversations["legacy"], args.turns, args.warmup),
+            await run("repository", repository_turn, sessions, proxy, user_id,
+                      conversations["repository"], args.turns, args.warmup),
+        ]
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(User).where(User.user_id == user_id))
+            await db.commit()
+        await engine.dispose()
+        await proxy.stop()
+
+    print(f"\n{'path':<16} {'round trips':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        print(f"{result['name']:<16} {result['round_trips']:>12.1f} {result['p50']:>9.2f} {result['p99']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""
+Локальный OpenAI-совместимый сервер для нагрузочных тестов (без реальных запросов и затрат).
+
+Поддерживает POST /v1/chat/completions (обычный и stream=True) с настраиваемыми
+временем до первого токена, скоростью генерации и долей ошибок.
+
+Запуск:
+    python -m benchmarks.fake_openai --port 9000 --ttft-ms 400 --tokens-per-second 40 --error-rate 0.01
+    # в .env API: OPENAI_BASE_URL=http://127.0.0.1:9000/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the derivative measures how a function changes as its input changes and photosynthesis "
+    "converts light energy into chemical energy stored in glucose let us work through an example "
+    "step by step so that every idea is clear before we move on"
+).split()
+
+app = FastAPI(title="Fake OpenAI")
+config = argparse.Namespace(ttft_ms=300.0, tokens_per_second=50.0, error_rate=0.0, rate_limit_rate=0.0, tokens=200)
+
+
+def _tokens(max_tokens: int | None) -> list[str]:
+    count = min(config.tokens, max_tokens or config.tokens)
+    return [random.choice(WORDS) + " " for _ in range(count)]
+
+
+def _maybe_error() -> JSONResponse | None:
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+            headers={"retry-after": "1"},
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected failure", "type": "server_error"}},
+        )
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+
+    error = _maybe_error()
+    if error is not None:
+        return error
+
+    tokens = _tokens(body.get("max_tokens"))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(config.ttft_ms / 1000 + len(tokens) / config.tokens_per_second)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    def frame(delta: dict, finish_reason: str | None = None) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def stream():
+        await asyncio.sleep(config.ttft_ms / 1000)
+        yield frame({"role": "assistant", "content": ""})
+        interval = 1 / config.tokens_per_second
+        for token in tokens:
+            yield frame({"content": token})
+            await asyncio.sleep(interval)
+        yield frame({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="время до первого токена")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=200, help="длина ответа (не больше max_tokens запроса)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    args = parser.parse_args()
+
+    config.ttft_ms = args.ttft_ms
+    config.tokens_per_second = args.tokens_per_second
+    config.tokens = args.tokens
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,174 @@
+"""
+Бенчмарк индексов горячих путей (миграция 0002).
+
+Заполняет БД синтетическими данными (по умолчанию 10k пользователей / 10M сообщений),
+затем для каждого запроса из chat/progress роутеров снимает EXPLAIN (ANALYZE, BUFFERS)
+и латентность без индексов и с индексами.
+
+Запуск (на отдельной БД, не на проде!):
+    alembic upgrade head
+    python -m benchmarks.hot_path_indexes --seed --users 10000 --messages 10000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+
+INDEXES = {
+    "ix_messages_conversation_id_created_at":
+        "CREATE INDEX ix_messages_conversation_id_created_at ON messages (conversation_id, created_at)",
+    "ix_conversations_user_id_updated_at":
+        "CREATE INDEX ix_conversations_user_id_updated_at ON conversations (user_id, updated_at DESC)",
+    "ix_messages_user_role_conversation_id_created_at":
+        "CREATE INDEX ix_messages_user_role_conversation_id_created_at ON messages (conversation_id, created_at) "
+        "WHERE role = 'user'",
+}
+
+# Запросы в том виде, в каком их генерируют app/chat/router.py и app/progress/router.py
+QUERIES = {
+    "conversation_list": """
+        SELECT conversation_id, title, created_at, updated_at FROM conversations
+        WHERE user_id = :user_id ORDER BY updated_at DESC, conversation_id DESC LIMIT 51
+    """,
+    "conversation_history": """
+        SELECT message_id, role, content, created_at FROM messages
+        WHERE conversation_id = :conversation_id AND created_at >= :conversation_created_at
+        ORDER BY created_at DESC, message_id DESC LIMIT 51
+    """,
+    # Прогресс читает дневную сводку user_daily_activity, а не messages
+    "progress_stats": """
+        SELECT coalesce(sum(user_messages), 0) AS total,
+               coalesce(sum(user_messages) FILTER (WHERE day >= date_trunc('week', current_date)::date), 0) AS weekly
+        FROM user_daily_activity WHERE user_id = :user_id
+    """,
+    "progress_activity": """
+        SELECT day, user_messages FROM user_daily_activity
+        WHERE user_id = :user_id AND day >= current_date - 363
+    """,
+}
+
+
+async def seed(conn, users: int, conversations_per_user: int, messages: int) -> None:
+    """Заполняет таблицы через generate_series - миллионы строк за один запрос"""
+    conversations = users * conversations_per_user
+    print(f"seeding {users} users, {conversations} conversations, {messages} messages...")
+    started = time.perf_counter()
+
+    await conn.execute(text("TRUNCATE users, conversations, messages CASCADE"))
+    await conn.execute(text("""
+        INSERT INTO users (user_id, username, email, hashed_password, is_active, created_at, weekly_goal_hours)
+        SELECT gen_random_uuid(), 'bench_' || i, 'bench_' || i || '@example.com', 'x', true, now(), 10
+        FROM generate_series(1, :users) AS i
+    """), {"users": users})
+    await conn.execute(text("""
+        INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at)
+        SELECT gen_random_uuid(), u.user_id, 'Conversation ' || g, now() - interval '366 days', now() - random() * interval '365 days'
+        FROM users u CROSS JOIN generate_series(1, :per_user) AS g
+    """), {"per_user": conversations_per_user})
+    # messages секционирована по месяцам (миграция 0007): секции на весь год синтетики
+    await conn.execute(text(
+        "SELECT ensure_message_partitions((now() - interval '366 days')::date, now()::date)"
+    ))
+    await conn.execute(text("""
+        WITH c AS (SELECT conversation_id, row_number() OVER () AS rn FROM conversations)
+        INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+        SELECT gen_random_uuid(), c.conversation_id,
+               CASE WHEN i % 2 = 0 THEN 'user' ELSE 'assistant' END,
+               repeat('lorem ipsum ', 10),
+               now() - random() * interval '365 days'
+        FROM generate_series(1, :messages) AS i
+        JOIN c ON c.rn = 1 + (i % :conversations)
+    """), {"messages": messages, "conversations": conversations})
+    await conn.execute(text("""
+        INSERT INTO user_daily_activity (user_id, day, user_messages)
+        SELECT c.user_id, (m.created_at AT TIME ZONE 'UTC')::date, count(*)
+        FROM messages m JOIN conversations c USING (conversation_id)
+        WHERE m.role = 'user'
+        GROUP BY 1, 2
+    """))
+    await conn.execute(text("ANALYZE users, conversations, messages, user_daily_activity"))
+
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+
+
+async def sample_params(conn) -> dict:
+    """Берём «тяжёлого» пользователя и его самый длинный разговор"""
+    row = (await conn.execute(text("""
+        SELECT c.user_id, c.conversation_id, c.created_at FROM messages m JOIN conversations c USING (conversation_id)
+        GROUP BY c.user_id, c.conversation_id ORDER BY count(*) DESC LIMIT 1
+    """))).first()
+    return {"user_id": row.user_id, "conversation_id": row.conversation_id, "conversation_created_at": row.created_at}
+
+
+async def measure(conn, params: dict, runs: int) -> dict:
+    results = {}
+    for name, sql in QUERIES.items():
+        query_params = {k: v for k, v in params.items() if f":{k}" in sql}
+        plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), query_params)).scalars().all()
+
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await conn.execute(text(sql), query_params)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        results[name] = {
+            "plan": "\n".join(plan),
+            "p50": statistics.median(timings),
+            "max": max(timings),
+        }
+    return results
+
+
+async def set_indexes(conn, enabled: bool) -> None:
+    for name, ddl in INDEXES.items():
+        await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if enabled:
+            await conn.execute(text(ddl))
+    await conn.execute(text("ANALYZE conversations, messages"))
+
+
+async def main(args) -> None:
+    engine = create_async_engine(settings.DATABASE_URL)
+
+    async with engine.begin() as conn:
+        if args.seed:
+            await seed(conn, args.users, args.conversations_per_user, args.messages)
+
+    async with engine.begin() as conn:
+        params = await sample_params(conn)
+
+        await set_indexes(conn, enabled=False)
+        before = await measure(conn, params, args.runs)
+
+        await set_indexes(conn, enabled=True)
+        after = await measure(conn, params, args.runs)
+
+    await engine.dispose()
+
+    for name in QUERIES:
+        print(f"\n=== {name}")
+        print(f"--- before (p50 {before[name]['p50']:.2f} ms, max {before[name]['max']:.2f} ms)")
+        print(before[name]["plan"])
+        print(f"--- after (p50 {after[name]['p50']:.2f} ms, max {after[name]['max']:.2f} ms)")
+        print(after[name]["plan"])
+
+    print("\nquery                   before p50    after p50    speedup")
+    for name in QUERIES:
+        b, a = before[name]["p50"], after[name]["p50"]
+        print(f"{name:<22} {b:>10.2f}ms {a:>10.2f}ms {b / a if a else 0:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="очистить таблицы и заполнить синтетикой")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--conversations-per-user", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""
+Сериализация ответов: прежний путь FastAPI против app/core/serialization.py.
+
+Прежний путь (как в serialize_response FastAPI): ORM-объекты -> pydantic-модели ->
+dump -> повторная валидация по response_model -> dump(mode="json") -> json.dumps.
+Быстрый: строки -> словари -> orjson.dumps. Для SSE - f-строка с json.dumps на каждый
+чанк против заранее закодированного шаблона кадра.
+
+Перед замером проверяется, что оба пути дают одинаковый JSON. БД не нужна.
+
+Запуск:
+    python -m benchmarks.json_serialization --items 200 --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.core.serialization import dumps, rows_to_dicts, orjson
+from app.chat.schemas import MessageResponse, MessagePage, ConversationResponse, ConversationPage
+from app.chat.sse import chunk_frame
+
+
+def legacy_dumps(content) -> bytes:
+    # Как JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def legacy_model_response(model, content) -> bytes:
+    """Возврат модели из эндпоинта с response_model"""
+    validated = model.model_validate(content.model_dump())
+    return legacy_dumps(validated.model_dump(mode="json"))
+
+
+def make_messages(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            message_id=uuid.uuid4(),
+            role="user" if i % 2 else "assistant",
+            content=f"Message {i}: photosynthesis converts light energy into chemical energy. " * 3,
+            created_at=now - timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def make_conversations(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            conversation_id=uuid.uuid4(),
+            title=f"Conversation {i}",
+            created_at=now - timedelta(days=i),
+            updated_at=now - timedelta(hours=i),
+        )
+        for i in range(count)
+    ]
+
+
+def make_heatmap() -> dict:
+    start = date.today() - timedelta(days=363)
+    activity = [
+        {"date": str(start + timedelta(days=i)), "count": i % 12, "level": "low"}
+        for i in range(364)
+    ]
+    return {"activity": activity, "total_days": len(activity)}
+
+
+def cases(items: int) -> dict:
+    messages = make_messages(items)
+    conversations = make_conversations(items)
+    heatmap = make_heatmap()
+    chunks = [f"token{i} " for i in range(items * 5)]
+
+    return {
+        "messages page": (
+            lambda: legacy_model_response(MessagePage, MessagePage(
+                items=[MessageResponse.model_validate(m) for m in messages], before_cursor="c", after_cursor="c"
+            )),
+            lambda: dumps({
+                "items": rows_to_dicts(messages, MessageResponse.model_fields),
+                "before_cursor": "c",
+                "after_cursor": "c",
+            }),
+        ),
+        "conversations page": (
+            lambda: legacy_model_response(ConversationPage, ConversationPage(
+                items=[ConversationResponse.model_validate(c) for c in conversations], next_cursor="c"
+            )),
+            lambda: dumps({
+                "items": rows_to_dicts(conversations, ConversationResponse.model_fields),
+                "next_cursor": "c",
+            }),
+        ),
+        "activity heatmap": (
+            lambda: legacy_dumps(heatmap),
+            lambda: dumps(heatmap),
+        ),
+        f"sse frames x{len(chunks)}": (
+            lambda: [f"data: {json.dumps({'content': chunk, 'type': 'chunk'})}\n\n".encode() for chunk in chunks],
+            lambda: [chunk_frame(chunk) for chunk in chunks],
+        ),
+    }
+
+
+def parsed(output):
+    if isinstance(output, list):
+        return [json.loads(frame.removeprefix(b"data: ")) for frame in output]
+    return json.loads(output)
+
+
+def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(args) -> None:
+    if orjson is None:
+        print("orjson is not installed - the fast path falls back to json")
+
+    print(f"\n{'case':<22} {'legacy ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for name, (legacy, fast) in cases(args.items).items():
+        assert parsed(legacy()) == parsed(fast()), f"{name}: outputs differ"
+        legacy_ms = measure(legacy, args.repeat)
+        fast_ms = measure(fast, args.repeat)
+        print(f"{name:<22} {legacy_ms:>10.3f} {fast_ms:>10.3f} {legacy_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,176 @@
+"""
+Нагрузочный тест API: виртуальные пользователи регистрируются, логинятся, создают
+разговор, листают список разговоров и стримят сообщения.
+
+Печатает p50/p95/p99 по эндпоинтам, пропускную способность и насыщение пула
+соединений с БД (по /health/pool: нужен --admin-token или API с OPS_ENDPOINTS_PUBLIC=true).
+
+Запуск (API должен смотреть на fake OpenAI, см. benchmarks/fake_openai.py):
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --users 100 --messages 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+API = "/api/v1"
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.pool_samples: list[dict] = []
+
+    def record(self, name: str, started: float, ok: bool) -> None:
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def timed(stats: Stats, name: str, request) -> httpx.Response | None:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        stats.record(name, started, ok=False)
+        return None
+    stats.record(name, started, ok=response.is_success)
+    return response
+
+
+async def stream_message(client: httpx.AsyncClient, stats: Stats, conversation_id: str, headers: dict) -> None:
+    started = time.perf_counter()
+    first_chunk = None
+    ok = False
+    try:
+        async with client.stream(
+            "POST",
+            f"{API}/chat/conversations/{conversation_id}/messages/stream",
+            json={"content": f"Explain derivatives, question {uuid.uuid4().hex[:6]}"},
+            headers=headers,
+        ) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: ") and '"chunk"' in line and first_chunk is None:
+                    first_chunk = time.perf_counter()
+                if line == "data: [DONE]":
+                    ok = True
+    except httpx.HTTPError:
+        pass
+
+    if first_chunk is not None:
+        stats.latencies["stream: time to first chunk"].append((first_chunk - started) * 1000)
+    stats.record("stream: full response", started, ok=ok)
+
+
+async def virtual_user(client: httpx.AsyncClient, stats: Stats, index: int, messages: int) -> None:
+    email = f"load_{uuid.uuid4().hex[:12]}@example.com"
+    password = "load-test-password"
+
+    await timed(stats, "POST /auth/register", client.post(
+        f"{API}/auth/register",
+        json={"username": f"load_{index}_{uuid.uuid4().hex[:8]}", "email": email, "password": password},
+    ))
+    response = await timed(stats, "POST /auth/login", client.post(
+        f"{API}/auth/login", data={"username": email, "password": password}
+    ))
+    if response is None or not response.is_success:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await timed(stats, "POST /chat/conversations", client.post(
+        f"{API}/chat/conversations", json={"title": "Load test"}, headers=headers
+    ))
+    if response is None or not response.is_success:
+        return
+    conversation_id = response.json()["conversation_id"]
+
+    for _ in range(messages):
+        await timed(stats, "GET /chat/conversations", client.get(f"{API}/chat/conversations", headers=headers))
+        await stream_message(client, stats, conversation_id, headers)
+        await timed(stats, "GET /chat/conversations/{id}/messages", client.get(
+            f"{API}/chat/conversations/{conversation_id}/messages", headers=headers
+        ))
+
+
+async def sample_pool(
+        client: httpx.AsyncClient, stats: Stats, stop: asyncio.Event, interval: float, admin_token: str | None
+) -> None:
+    headers = {"Authorization": f"Bearer {admin_token}"} if admin_token else None
+    while not stop.is_set():
+        try:
+            response = await client.get("/health/pool", headers=headers)
+            if response.is_success:
+                stats.pool_samples.append(response.json())
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    print(f"\n{'endpoint':<42}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    total = 0
+    for name, values in sorted(stats.latencies.items()):
+        if not name.startswith("stream: time"):
+            total += len(values)
+        print(
+            f"{name:<42}{len(values):>7}{stats.errors[name]:>8}"
+            f"{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}{percentile(values, 99):>10.1f}"
+        )
+
+    streams = len(stats.latencies["stream: full response"])
+    print(f"\nduration {elapsed:.1f}s, throughput {total / elapsed:.1f} req/s, {streams / elapsed:.2f} streams/s")
+
+    if stats.pool_samples:
+        capacity = stats.pool_samples[0]["size"] + stats.pool_samples[0]["max_overflow"]
+        checked_out = [sample["checked_out"] for sample in stats.pool_samples]
+        saturated = sum(1 for value in checked_out if value >= capacity)
+        print(
+            f"db pool: capacity {capacity}, checked out avg {statistics.mean(checked_out):.1f} / max {max(checked_out)}, "
+            f"max overflow {max(sample['overflow'] for sample in stats.pool_samples)}, "
+            f"saturated {saturated / len(checked_out) * 100:.0f}% of samples"
+        )
+
+
+async def main(args) -> None:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_pool(client, stats, stop, args.pool_interval, args.admin_token))
+
+        started = time.perf_counter()
+        users = []
+        for i in range(args.users):
+            users.append(asyncio.create_task(virtual_user(client, stats, i, args.messages)))
+            await asyncio.sleep(args.ramp / args.users if args.users else 0)
+        await asyncio.gather(*users)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await sampler
+
+    report(stats, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=3, help="сообщений на пользователя")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд запустить всех пользователей")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--pool-interval", type=float, default=0.25)
+    parser.add_argument("--admin-token", help="токен администратора для /health/pool")
+    asyncio.run(main(parser.parse_args()))
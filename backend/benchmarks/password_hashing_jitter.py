@@ -0,0 +1,82 @@
+"""
+Джиттер SSE-стрима во время всплеска логинов.
+
+Имитирует стрим, который отдаёт чанк каждые --interval мс, и параллельно запускает
+--logins проверок пароля: сначала синхронно в event loop (как было), потом через
+пул потоков (verify_password_async). Печатает задержку чанков относительно графика.
+
+Запуск:
+    python -m benchmarks.password_hashing_jitter --logins 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import HTTPException
+
+from app.core.security import hash_password, verify_password, verify_password_async
+
+
+async def fake_stream(interval: float, stop: asyncio.Event) -> list[float]:
+    """Возвращает опоздание каждого чанка в мс"""
+    lateness = []
+    next_tick = time.perf_counter() + interval
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+        lateness.append((time.perf_counter() - next_tick) * 1000)
+        next_tick += interval
+    return lateness
+
+
+async def blocking_login(password: str, hashed: str) -> None:
+    verify_password(password, hashed)
+    await asyncio.sleep(0)
+
+
+async def executor_login(password: str, hashed: str) -> bool:
+    try:
+        await verify_password_async(password, hashed)
+        return True
+    except HTTPException:
+        return False
+
+
+async def run(mode: str, logins: int, interval: float, password: str, hashed: str) -> None:
+    stop = asyncio.Event()
+    stream = asyncio.create_task(fake_stream(interval, stop))
+    await asyncio.sleep(interval * 5)
+
+    started = time.perf_counter()
+    if mode == "blocking":
+        await asyncio.gather(*(blocking_login(password, hashed) for _ in range(logins)))
+        rejected = 0
+    else:
+        results = await asyncio.gather(*(executor_login(password, hashed) for _ in range(logins)))
+        rejected = results.count(False)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    lateness = sorted(await stream)
+
+    p99 = lateness[int(len(lateness) * 0.99) - 1] if len(lateness) > 1 else lateness[0]
+    print(
+        f"{mode:<9} logins={logins:<4} rejected={rejected:<4} total={elapsed * 1000:8.1f}ms  "
+        f"chunk lateness p50={statistics.median(lateness):7.2f}ms p99={p99:7.2f}ms max={lateness[-1]:7.2f}ms"
+    )
+
+
+async def main(args) -> None:
+    password = "correct horse battery staple"
+    hashed = hash_password(password)
+    interval = args.interval / 1000
+
+    await run("blocking", args.logins, interval, password, hashed)
+    await run("executor", args.logins, interval, password, hashed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=20, help="интервал между чанками стрима, мс")
+    asyncio.run(main(parser.parse_args()))
@@ -1,21 +1,46 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.auth import router as auth_router
 from app.chat import router as chat_router
 from app.progress import router as progress_router
-from app.core.database import engine, Base
+from app.admin import router as admin_router
+from app.auth.dependencies import get_admin_user
+from app.core.config import settings
+from app.core.database import engine, pool_status
+from app.core.metrics import registry as metrics_registry, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.core.security import shutdown_password_executor
+from app.core.serialization import FAST_JSON, FastJSONResponse
+from app.jobs.runner import runner as job_runner
+from app.chat.scheduler import llm_scheduler
+from app.chat.partitions import partition_maintenance
+from app.chat.generations import generations
+from app.chat import tasks as chat_tasks  # noqa: F401 - регистрирует обработчики фоновых задач
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Схема БД управляется миграциями: alembic upgrade head
+    job_runner.start()
+    partition_maintenance.start()
     yield
 
+    # Идущие ответы AI останавливаются с сохранением накопленного текста
+    await generations.shutdown()
+    await partition_maintenance.stop()
+    await job_runner.stop()
+    shutdown_password_executor()
     await engine.dispose()
 
-app = FastAPI(title="Educelo API", version="0.1.0", lifespan=lifespan)
+app = FastAPI(
+    title="Educelo API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse,
+)
+
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,11 +57,31 @@ app.add_middleware(
 app.include_router(auth_router.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(chat_router.router, prefix="/api/v1/chat", tags=["chat"])
 app.include_router(progress_router.router, prefix="/api/v1/progress", tags=["progress"])
+app.include_router(admin_router.router, prefix="/api/v1/admin", tags=["admin"])
 
 @app.post("/health")
 def health():
     return {"status": "ok"}
 
+# Состояние пула, очереди LLM и метрики - только для администратора (или закрытой сети)
+ops_dependencies = [] if settings.OPS_ENDPOINTS_PUBLIC else [Depends(get_admin_user)]
+
+@app.get("/health/pool", dependencies=ops_dependencies)
+def health_pool():
+    return pool_status()
+
+@app.get("/health/llm", dependencies=ops_dependencies)
+def health_llm():
+    return llm_scheduler.stats()
+
+metrics_registry.gauge("llm_active_requests", "Outbound LLM requests in flight", lambda: llm_scheduler.stats()["active"])
+metrics_registry.gauge("llm_queued_requests", "LLM requests waiting for admission", llm_scheduler.queue_depth)
+metrics_registry.gauge("llm_generations_buffered", "Streaming generations held for reattach", lambda: len(generations))
+
+@app.get("/metrics", include_in_schema=False, dependencies=ops_dependencies)
+def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/")
 def root():
     return {"message": "http://localhost:8000/docs"}
\ No newline at end of file
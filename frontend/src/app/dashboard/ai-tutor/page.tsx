@@ -1,14 +1,15 @@
 'use client'
 
-import { useState, useEffect, useRef } from 'react'
+import { useState, useEffect, useLayoutEffect, useRef } from 'react'
 import { useAuth } from '@/lib/context/AuthContext'
 import { useSearchParams } from 'next/navigation'
 import {
-    getConversations,
+    getConversationsPage,
     createConversation,
     getConversation,
+    getConversationInfo,
+    getMessages,
     sendMessageStream,
-    generateConversationTitle,
     deleteMessage
 } from '@/lib/api'
 import type {
@@ -32,11 +33,19 @@ export default function AITutorPage() {
     const [loading, setLoading] = useState(false)
     const [sending, setSending] = useState(false)
     const [newMessageIds, setNewMessageIds] = useState<Set<string>>(new Set())
+    // Курсор более старых сообщений (null - загружены все)
+    const [beforeCursor, setBeforeCursor] = useState<string | null>(null)
+    const [loadingOlder, setLoadingOlder] = useState(false)
 
     // ID of the AI message currently being generated
     const [currentAiMessageId, setCurrentAiMessageId] = useState<string | null>(null)
     // Ref for autoscrolling to bottom of messages
     const messagesEndRef = useRef<HTMLDivElement>(null)
+    const messagesContainerRef = useRef<HTMLDivElement>(null)
+    // Расстояние от низа до верха прокрутки перед подгрузкой старых сообщений - чтобы остаться на месте
+    const scrollFromBottomRef = useRef<number | null>(null)
+    // Открытый разговор: ответ на подгрузку старых сообщений другого разговора отбрасывается
+    const openConversationIdRef = useRef<string | null>(null)
     // Reff for aborting ongoing requests
     const abortControllerRef = useRef<AbortController | null>(null)
 
@@ -48,15 +57,21 @@ export default function AITutorPage() {
         }
     }, [conversationId])
 
-    // Автопрокрутка при новых сообщениях
-    useEffect(() => {
+    // Автопрокрутка при новых сообщениях; после подгрузки старых - остаёмся на том же месте
+    useLayoutEffect(() => {
+        const container = messagesContainerRef.current
+        if (scrollFromBottomRef.current !== null && container) {
+            container.scrollTop = container.scrollHeight - scrollFromBottomRef.current
+            scrollFromBottomRef.current = null
+            return
+        }
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
     }, [messages])
 
     const loadConversations = async () => {
         try {
-            const data = await getConversations()
-            setConversations(data)
+            const page = await getConversationsPage()
+            setConversations(page.items)
         } catch (error) {
             console.error('Failed to load conversations:', error)
         }
@@ -80,9 +95,11 @@ export default function AITutorPage() {
     const loadConversation = async (conversationId: string) => {
         try {
             setLoading(true)
+            openConversationIdRef.current = conversationId
             const data = await getConversation(conversationId)
             setCurrentConversation(data)
             setMessages(data.messages)
+            setBeforeCursor(data.before_cursor ?? null)
             setNewMessageIds(new Set())  // Сбрасываем флаги при загрузке
         } catch (error) {
             console.error('Failed to load conversation:', error)
@@ -91,6 +108,33 @@ export default function AITutorPage() {
         }
     }
 
+    // Прокрутка к началу - подгружаем предыдущую страницу сообщений
+    const loadOlderMessages = async () => {
+        if (!currentConversation || !beforeCursor || loadingOlder) return
+
+        const conversationId = currentConversation.conversation_id
+        try {
+            setLoadingOlder(true)
+            const page = await getMessages(conversationId, { before: beforeCursor })
+            if (openConversationIdRef.current !== conversationId) return
+
+            const container = messagesContainerRef.current
+            scrollFromBottomRef.current = container ? container.scrollHeight - container.scrollTop : null
+            setMessages(prev => [...[...page.items].reverse(), ...prev])
+            setBeforeCursor(page.before_cursor)
+        } catch (error) {
+            console.error('Failed to load older messages:', error)
+        } finally {
+            setLoadingOlder(false)
+        }
+    }
+
+    const handleMessagesScroll = (e: React.UIEvent<HTMLDivElement>) => {
+        if (e.currentTarget.scrollTop < 200) {
+            loadOlderMessages()
+        }
+    }
+
     const handleStopGeneration = () => {
         if (abortControllerRef.current) {
             console.log('🛑 Stopping generation...')
@@ -171,20 +215,16 @@ export default function AITutorPage() {
                         return newSet
                     })
 
-                    // Генерируем AI название после первого сообщения
+                    // Название генерируется на сервере фоновой задачей - просто подтягиваем его
                     if (isFirstMessage) {
-                        console.log('🔄 Generating title for first message...')
-                        try {
-                            const updatedConversation = await generateConversationTitle(
+                        const refreshTitle = async () => {
+                            const updatedConversation = await getConversationInfo(
                                 currentConversation.conversation_id
                             )
 
-                            console.log('✅ Title generated:', updatedConversation.title)
-
-                            setCurrentConversation({
-                                ...currentConversation,
-                                title: updatedConversation.title
-                            })
+                            setCurrentConversation(prev =>
+                                prev ? { ...prev, title: updatedConversation.title } : prev
+                            )
 
                             setConversations(prev =>
                                 prev.map(conv =>
@@ -193,26 +233,18 @@ export default function AITutorPage() {
                                         : conv
                                 )
                             )
-                        } catch (error) {
-                            console.error('❌ Failed to generate title:', error)
-
-                            const fallbackTitle = userMessageContent.slice(0, 50) +
-                                (userMessageContent.length > 50 ? '...' : '')
-
-                            console.log('🔄 Using fallback title:', fallbackTitle)
 
-                            setCurrentConversation({
-                                ...currentConversation,
-                                title: fallbackTitle
-                            })
+                            return updatedConversation.title !== currentConversation.title
+                        }
 
-                            setConversations(prev =>
-                                prev.map(conv =>
-                                    conv.conversation_id === currentConversation.conversation_id
-                                        ? { ...conv, title: fallbackTitle }
-                                        : conv
-                                )
-                            )
+                        try {
+                            if (!(await refreshTitle())) {
+                                setTimeout(() => {
+                                    refreshTitle().catch(error => console.error('❌ Failed to refresh title:', error))
+                                }, 2000)
+                            }
+                        } catch (error) {
+                            console.error('❌ Failed to refresh title:', error)
                         }
                     }
 
@@ -234,7 +266,11 @@ export default function AITutorPage() {
                         return newSet
                     })
                 },
-                abortControllerRef.current.signal
+                abortControllerRef.current.signal,
+                // ID ответа известен с первого кадра: по «стоп» сообщение удаляется, и сервер прекращает генерацию
+                (messageId: string) => {
+                    messageIdForDeletion = messageId
+                }
             )
         } catch (error: any) {
             if (error.name === 'AbortError' || abortControllerRef.current === null) {
@@ -362,8 +398,24 @@ export default function AITutorPage() {
                 // Chat Interface
                 <>
                     {/* Messages */}
-                    <div className="flex-1 overflow-auto p-6 pb-32 custom-scrollbar">
+                    <div
+                        ref={messagesContainerRef}
+                        onScroll={handleMessagesScroll}
+                        className="flex-1 overflow-auto p-6 pb-32 custom-scrollbar"
+                    >
                         <div className="space-y-4">
+                            {beforeCursor && (
+                                <div className="flex justify-center">
+                                    <button
+                                        type="button"
+                                        onClick={loadOlderMessages}
+                                        disabled={loadingOlder}
+                                        className="text-sm text-zinc-400 hover:text-purple-300 transition-colors disabled:opacity-50 cursor-pointer"
+                                    >
+                                        {loadingOlder ? 'Loading...' : 'Load earlier messages'}
+                                    </button>
+                                </div>
+                            )}
                             {messages.map((message, index) => (
                                 <div
                                     key={message.message_id}
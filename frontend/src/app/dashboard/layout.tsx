@@ -4,13 +4,16 @@ import { ReactNode, useState, useEffect } from 'react'
 import { useRouter } from 'next/navigation'
 import Sidebar from '@/components/layout/Sidebar'
 import ProtectedRoute from '@/app/auth/ProtectedRoute'
-import { getConversations } from '@/lib/api'
+import { getConversationsPage } from '@/lib/api'
 import { Conversation } from '@/lib/types'
 
 export default function DashboardLayout({ children }: { children: ReactNode }) {
     const [sidebarOpen, setSidebarOpen] = useState(false)
     const [conversations, setConversations] = useState<Conversation[]>([])
     const [loading, setLoading] = useState(true)
+    // Курсор следующей страницы списка (null - загружены все)
+    const [nextCursor, setNextCursor] = useState<string | null>(null)
+    const [loadingMore, setLoadingMore] = useState(false)
     const router = useRouter()
 
     useEffect(() => {
@@ -19,8 +22,9 @@ export default function DashboardLayout({ children }: { children: ReactNode }) {
 
     const loadConversations = async () => {
         try {
-            const data = await getConversations()
-            setConversations(data)
+            const page = await getConversationsPage()
+            setConversations(page.items)
+            setNextCursor(page.next_cursor)
         } catch (error) {
             console.error('Failed to load conversations:', error)
         } finally {
@@ -28,6 +32,25 @@ export default function DashboardLayout({ children }: { children: ReactNode }) {
         }
     }
 
+    // Следующая страница - когда список прокручен до конца или по кнопке
+    const loadMoreConversations = async () => {
+        if (!nextCursor || loadingMore) return
+
+        try {
+            setLoadingMore(true)
+            const page = await getConversationsPage(nextCursor)
+            setConversations(prev => {
+                const loaded = new Set(prev.map(conv => conv.conversation_id))
+                return [...prev, ...page.items.filter(conv => !loaded.has(conv.conversation_id))]
+            })
+            setNextCursor(page.next_cursor)
+        } catch (error) {
+            console.error('Failed to load more conversations:', error)
+        } finally {
+            setLoadingMore(false)
+        }
+    }
+
     const handleConversationDeleted = (conversationId: string) => {
         // Удаляем из списка
         setConversations(prev => prev.filter(conv => conv.conversation_id !== conversationId))
@@ -67,6 +90,9 @@ export default function DashboardLayout({ children }: { children: ReactNode }) {
                         onNavigate={() => setSidebarOpen(false)}
                         conversations={conversations}
                         loading={loading}
+                        hasMore={nextCursor !== null}
+                        loadingMore={loadingMore}
+                        onLoadMore={loadMoreConversations}
                         onConversationDeleted={handleConversationDeleted}
                     />
                 </div>
@@ -15,10 +15,21 @@ interface SidebarProps {
     onNavigate?: () => void
     conversations: Conversation[]
     loading: boolean
+    hasMore?: boolean  // на сервере есть ещё разговоры (следующая страница)
+    loadingMore?: boolean
+    onLoadMore?: () => void
     onConversationDeleted?: (conversationId: string) => void  // Добавили callback
 }
 
-const Sidebar: FC<SidebarProps> = ({ onNavigate, conversations, loading, onConversationDeleted }) => {
+const Sidebar: FC<SidebarProps> = ({
+    onNavigate,
+    conversations,
+    loading,
+    hasMore = false,
+    loadingMore = false,
+    onLoadMore,
+    onConversationDeleted
+}) => {
     const pathname = usePathname()
     const { user, logout } = useAuth()
     const [deletingId, setDeletingId] = useState<string | null>(null)
@@ -77,6 +88,14 @@ const Sidebar: FC<SidebarProps> = ({ onNavigate, conversations, loading, onConve
         }
     }
 
+    // Список прокручен почти до конца - подгружаем следующую страницу
+    const handleConversationsScroll = (e: React.UIEvent<HTMLDivElement>) => {
+        const list = e.currentTarget
+        if (hasMore && !loadingMore && list.scrollHeight - list.scrollTop - list.clientHeight < 200) {
+            onLoadMore?.()
+        }
+    }
+
     return (
         <aside className="w-64 h-full bg-zinc-950 border-r border-zinc-800 flex flex-col">
             {/* Logo */}
@@ -129,7 +148,7 @@ const Sidebar: FC<SidebarProps> = ({ onNavigate, conversations, loading, onConve
             </nav>
 
             {/* Recent Conversations */}
-            <div className="flex-1 overflow-auto p-4 custom-scrollbar">
+            <div className="flex-1 overflow-auto p-4 custom-scrollbar" onScroll={handleConversationsScroll}>
                 <div className="flex items-center justify-between mb-3">
                     <h3 className="text-sm font-semibold text-gray-400 flex items-center gap-2">
                         <MessageSquare size={16} />
@@ -163,7 +182,7 @@ const Sidebar: FC<SidebarProps> = ({ onNavigate, conversations, loading, onConve
                     </div>
                 ) : (
                     <div className="space-y-2">
-                        {conversations.slice(0, 10).map((conv) => (
+                        {conversations.map((conv) => (
                             <div key={conv.conversation_id} className="group relative">
                                 <Link
                                     href={`/dashboard/ai-tutor?id=${conv.conversation_id}`}
@@ -218,9 +237,13 @@ const Sidebar: FC<SidebarProps> = ({ onNavigate, conversations, loading, onConve
                     </div>
                 )}
 
-                {conversations.length > 10 && (
-                    <button className="w-full mt-4 py-2 text-sm text-gray-400 hover:text-white transition-colors">
-                        View all ({conversations.length}) →
+                {!loading && hasMore && (
+                    <button
+                        onClick={onLoadMore}
+                        disabled={loadingMore}
+                        className="w-full mt-4 py-2 text-sm text-gray-400 hover:text-white transition-colors cursor-pointer disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Loading...' : 'Load more →'}
                     </button>
                 )}
             </div>
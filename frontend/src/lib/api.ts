@@ -1,4 +1,4 @@
-import {LoginData, RegisterData, User, AuthResponse, Conversation, ConversationCreate, ConversationWithMessages, MessageCreate} from "@/lib/types";
+import {LoginData, RegisterData, User, AuthResponse, Conversation, ConversationCreate, ConversationPage, ConversationWithMessages, MessagePage, MessageCreate, SearchPage} from "@/lib/types";
 import {error} from "next/dist/build/output/log";
 import {Message} from "postcss";
 
@@ -90,15 +90,20 @@ export async function createConversation(data: ConversationCreate): Promise<Conv
     return response.json()
 }
 
-// Получить список разговоров
-export async function getConversations(): Promise<Conversation[]> {
+// Получить список разговоров (одна страница, следующая - по next_cursor)
+export async function getConversationsPage(cursor?: string, limit = 50): Promise<ConversationPage> {
     const token = localStorage.getItem('access_token')
 
     if (!token) {
         throw new Error('No access token found')
     }
 
-    const response = await fetch(`${API_URL}/api/v1/chat/conversations`, {
+    const params = new URLSearchParams({limit: String(limit)})
+    if (cursor) {
+        params.append('cursor', cursor)
+    }
+
+    const response = await fetch(`${API_URL}/api/v1/chat/conversations?${params}`, {
         method: 'GET',
         headers: {
             'Authorization': `Bearer ${token}`,
@@ -113,8 +118,36 @@ export async function getConversations(): Promise<Conversation[]> {
     return response.json()
 }
 
-// Получить конкретный разговор с сообщениями
-export async function getConversation(conversationId: string): Promise<ConversationWithMessages> {
+// Полнотекстовый поиск по всем разговорам пользователя
+export async function searchMessages(query: string, cursor?: string, limit = 20): Promise<SearchPage> {
+    const token = localStorage.getItem('access_token')
+
+    if (!token) {
+        throw new Error('No access token found')
+    }
+
+    const params = new URLSearchParams({q: query, limit: String(limit)})
+    if (cursor) {
+        params.append('cursor', cursor)
+    }
+
+    const response = await fetch(`${API_URL}/api/v1/chat/search?${params}`, {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    })
+
+    if (!response.ok) {
+        const error = await response.json()
+        throw new Error(error.detail || 'Failed to search messages')
+    }
+
+    return response.json()
+}
+
+// Получить метаданные разговора (без сообщений)
+export async function getConversationInfo(conversationId: string): Promise<Conversation> {
     const token = localStorage.getItem('access_token')
 
     if (!token) {
@@ -136,6 +169,54 @@ export async function getConversation(conversationId: string): Promise<Conversat
     return response.json()
 }
 
+// Получить страницу сообщений (от новых к старым), старее - по before_cursor
+export async function getMessages(
+    conversationId: string,
+    options: {before?: string, after?: string, limit?: number} = {}
+): Promise<MessagePage> {
+    const token = localStorage.getItem('access_token')
+
+    if (!token) {
+        throw new Error('No access token found')
+    }
+
+    const params = new URLSearchParams({limit: String(options.limit ?? 50)})
+    if (options.before) {
+        params.append('before', options.before)
+    }
+    if (options.after) {
+        params.append('after', options.after)
+    }
+
+    const response = await fetch(`${API_URL}/api/v1/chat/conversations/${conversationId}/messages?${params}`, {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    })
+
+    if (!response.ok) {
+        const error = await response.json()
+        throw new Error(error.detail || 'Failed to get messages')
+    }
+
+    return response.json()
+}
+
+// Получить разговор с последними сообщениями (в хронологическом порядке)
+export async function getConversation(conversationId: string): Promise<ConversationWithMessages> {
+    const [conversation, page] = await Promise.all([
+        getConversationInfo(conversationId),
+        getMessages(conversationId),
+    ])
+
+    return {
+        ...conversation,
+        messages: [...page.items].reverse(),
+        before_cursor: page.before_cursor,
+    }
+}
+
 // Отправить сообщение
 export async function sendMessage(
     conversationId: string,
@@ -167,13 +248,77 @@ export async function sendMessage(
     return response.json() as Promise<Message>
 }
 
+// Читает SSE-стрим ответа AI (кадры start / chunk / [DONE], комментарии ": ping" пропускаются)
+async function readMessageStream(
+    response: Response,
+    onChunk: (chunk: string) => void,
+    onComplete: (messageId: string) => void,
+    onStart?: (messageId: string) => void,
+    onEventId?: (eventId: string) => void
+): Promise<void> {
+    const reader = response.body?.getReader()
+    const decoder = new TextDecoder()
+
+    if (!reader) {
+        throw new Error('No reader available')
+    }
+
+    let messageId = ''
+    // Кадр может прийти по частям в разных read() - неполную строку доклеиваем к следующему куску
+    let pending = ''
+
+    while (true) {
+        const { done, value } = await reader.read()
+
+        if (done) break
+
+        pending += decoder.decode(value, { stream: true })
+        const lines = pending.split('\n')
+        pending = lines.pop() ?? ''
+
+        for (const line of lines) {
+            // id кадра - позиция в ответе, с неё можно переподключиться (attachMessageStream)
+            if (line.startsWith('id: ')) {
+                onEventId?.(line.slice(4))
+                continue
+            }
+
+            if (line.startsWith('data: ')) {
+                const data = line.slice(6)
+
+                if (data === '[DONE]') {
+                    onComplete(messageId)
+                    return
+                }
+
+                try {
+                    const parsed = JSON.parse(data)
+
+                    if (parsed.message_id) {
+                        messageId = parsed.message_id
+                        onStart?.(messageId)
+                    }
+
+                    if (parsed.content) {
+                        onChunk(parsed.content)
+                    }
+                } catch (e) {
+                    console.error('Failed to parse SSE data:', e)
+                }
+            }
+        }
+    }
+}
+
 export async function sendMessageStream(
     conversationId: string,
     data: MessageCreate,
     onChunk: (chunk: string) => void,
     onComplete: (messageId: string) => void,
     onError: (error: string) => void,
-    signal?: AbortSignal
+    signal?: AbortSignal,
+    onStart?: (messageId: string) => void,
+    onEventId?: (eventId: string) => void
 ): Promise<void> {
     const token = localStorage.getItem('access_token')
 
@@ -200,51 +345,58 @@ export async function sendMessageStream(
             throw new Error(error.detail || 'Failed to send message')
         }
 
-        const reader = response.body?.getReader()
-        const decoder = new TextDecoder()
-
-        if (!reader) {
-            throw new Error('No reader available')
+        await readMessageStream(response, onChunk, onComplete, onStart, onEventId)
+    } catch (error) {
+        if (error instanceof Error && error.name === 'AbortError') {
+            console.log('Generation stopped by user')
+            throw error
         }
 
-        let messageId = ''
-
-        while (true) {
-            const { done, value } = await reader.read()
-
-            if (done) break
-
-            const chunk = decoder.decode(value, { stream: true })
-            const lines = chunk.split('\n')
+        const errorMessage = error instanceof Error ? error.message : 'Unknown error'
+        onError(errorMessage)
+        throw error
+    }
+}
 
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    const data = line.slice(6)
+// Подключиться к ответу AI (другая вкладка или обрыв связи): lastEventId - последний полученный id,
+// придёт только текст после него; завершённый ответ сервер отдаёт из БД
+export async function attachMessageStream(
+    conversationId: string,
+    messageId: string,
+    onChunk: (chunk: string) => void,
+    onComplete: (messageId: string) => void,
+    onError: (error: string) => void,
+    lastEventId?: string,
+    signal?: AbortSignal,
+    onEventId?: (eventId: string) => void
+): Promise<void> {
+    const token = localStorage.getItem('access_token')
 
-                    if (data === '[DONE]') {
-                        onComplete(messageId)
-                        return
-                    }
+    if (!token) {
+        throw new Error('No access token found')
+    }
 
-                    try {
-                        const parsed = JSON.parse(data)
+    const headers: Record<string, string> = {
+        'Authorization': `Bearer ${token}`,
+    }
+    if (lastEventId) {
+        headers['Last-Event-ID'] = lastEventId
+    }
 
-                        if (parsed.message_id) {
-                            messageId = parsed.message_id
-                        }
+    try {
+        const response = await fetch(
+            `${API_URL}/api/v1/chat/conversations/${conversationId}/messages/${messageId}/stream`,
+            { headers, signal }
+        )
 
-                        if (parsed.content) {
-                            onChunk(parsed.content)
-                        }
-                    } catch (e) {
-                        console.error('Failed to parse SSE data:', e)
-                    }
-                }
-            }
+        if (!response.ok) {
+            const error = await response.json()
+            throw new Error(error.detail || 'Failed to attach to message stream')
         }
+
+        await readMessageStream(response, onChunk, onComplete, undefined, onEventId)
     } catch (error) {
         if (error instanceof Error && error.name === 'AbortError') {
-            console.log('Generation stopped by user')
             throw error
         }
 
@@ -45,8 +45,35 @@ export interface Conversation {
     updated_at: string
 }
 
+export interface ConversationPage {
+    items: Conversation[]
+    next_cursor: string | null
+}
+
+export interface SearchHit {
+    message_id: string
+    conversation_id: string
+    conversation_title: string
+    role: 'user' | 'assistant'
+    snippet: string  // совпадения выделены **жирным** (markdown)
+    rank: number
+    created_at: string
+}
+
+export interface SearchPage {
+    items: SearchHit[]
+    next_cursor: string | null
+}
+
+export interface MessagePage {
+    items: Message[]
+    before_cursor: string | null
+    after_cursor: string | null
+}
+
 export interface ConversationWithMessages extends Conversation {
     messages: Message[]
+    before_cursor?: string | null
 }
 
 export interface MessageCreate {